@@ -1,6 +1,4 @@
 
-const db = firebase.firestore();
-
 const width = window.innerWidth * 0.45;
 const height = window.innerHeight * 0.45;
 
@@ -46,33 +44,59 @@ function colorScale(t) {
 Data
 */
 const reps = window.sessionStorage;
+
+/*
+Per-state bundles: reps keyed by district and topology in one content-hashed
+static file, state summaries in the manifest (see database-dev/states_to_bundles.py)
+*/
+const getManifest = d3.json("data/bundles/manifest.json");
+
+// Brotli where the browser decodes it (secure contexts), gzip otherwise
+const bundleEncoding = window.isSecureContext ? "br" : "gzip";
+
+const bundles = {};
+function getBundle(state) {
+  if (!(state in bundles)) {
+    bundles[state] = getManifest
+      .then((manifest) => {
+        const files = manifest[state];
+        return d3.json(`data/bundles/${files[bundleEncoding] || files["gzip"]}`);
+      })
+      .then((bundle) => {
+        reps.setItem(`${state}`, JSON.stringify(bundle.reps));
+        return bundle;
+      });
+  };
+  return bundles[state];
+}
+
 const genderData = Array();
-const getGenderData = db.collection("state_gender").get().then((snapshot) => {
-  snapshot.docs.forEach((doc) => {
-    var m = doc.data()["M"];
-    var f = doc.data()["F"];
-    var total = m + f;
-    m = m / total;
-    f = f / total;
-    genderData[doc.data()["_id"]] = {"M": m, "F": f};
+const getGenderData = getManifest.then((manifest) => {
+  Object.keys(manifest).forEach((state) => {
+    const gender = manifest[state]["summary"]["gender"];
+    if (gender) {
+      var m = gender["M"];
+      var f = gender["F"];
+      var total = m + f;
+      genderData[state] = {"M": m / total, "F": f / total};
+    };
   });
 });
 const eduData = Array();
-const getEduData = db.collection("state_edu").get().then((snapshot) => {
-  snapshot.docs.forEach((doc) => {
-    const total = doc.data()["count"];
-    const state = doc.data()["_id"];
-    eduData[state] = {};
-    const eduDegrees = Object.keys(doc.data());
-    eduDegrees.forEach((degree) => {
-      if (degree !== "_id" && degree !== "count") {
-        const count = doc.data()[degree];
-        eduData[state][degree] = count / total;
-      } else if (degree == "count") {
-        const count = doc.data()[degree];
-        eduData[state][degree] = count;
-      };
-    });
+const getEduData = getManifest.then((manifest) => {
+  Object.keys(manifest).forEach((state) => {
+    const edu = manifest[state]["summary"]["edu"];
+    if (edu) {
+      const total = edu["count"];
+      eduData[state] = {};
+      Object.keys(edu).forEach((degree) => {
+        if (degree !== "count") {
+          eduData[state][degree] = edu[degree] / total;
+        } else {
+          eduData[state][degree] = edu[degree];
+        };
+      });
+    };
   });
 });
 
@@ -126,61 +150,36 @@ State map
 */
 Promise.all([nationalMap]).then(stateMap);
 function stateMap() {
-  const stateTopo = d3.json(`data/${stateId}.topo.json`);
-  stateTopo.then((state) => {
+  getBundle(stateId).then((bundle) => {
     stateClickLabel.text(`State Selected: ${stateId}`);
+    var state = bundle.topology;
     var cds = topojson.feature(state, state.objects.data);
     var projState = d3.geoMercator();
     var cdPath = d3.geoPath(projState);
     projState.fitSize([width*0.8, height*0.8], cds);
-    Promise.all([getReps])
-      .then(function() {
-        stateG.selectAll("path")
-          .data(cds.features)
-          .enter()
-          .append("path")
-          .attr("d", cdPath)
-          .attr("class", "cd")
-          .attr("id", (d) => {
-            if (d.properties.cd116 == "98") {
-              return "cd00";
-            } else {
-              return `cd${d.properties.cd116}`;
-            };
-          })
-          .attr("data", "none")
-          .attr("transform", "translate(10, 10)")
-          .on("mouseover", mouseOverHandler)
-          .on("mousemove", mouseMoveHandler)
-          .on("mouseout", mouseOutHandler)
-          .on("click", districtClick);
+    stateG.selectAll("path")
+      .data(cds.features)
+      .enter()
+      .append("path")
+      .attr("d", cdPath)
+      .attr("class", "cd")
+      .attr("id", (d) => {
+        if (d.properties.cd116 == "98") {
+          return "cd00";
+        } else {
+          return `cd${d.properties.cd116}`;
+        };
       })
-      .then(fillDistricts);
+      .attr("data", "none")
+      .attr("transform", "translate(10, 10)")
+      .on("mouseover", mouseOverHandler)
+      .on("mousemove", mouseMoveHandler)
+      .on("mouseout", mouseOutHandler)
+      .on("click", districtClick);
+    fillDistricts();
   });
 }
 
-function getReps() {
-  if (reps.getItem(stateId) === null) {
-    db.collection("reps").where("state", "==", `${stateId}`)
-      .get()
-      .then((snapshot) => {
-        var stateReps = {};
-        snapshot.forEach((doc) => {
-          if (doc.data()['district'] == "At-Large") {
-            var district = "00";
-          } else {
-            var district = doc.data()['district'].toLocaleString('en-US', {
-              minimumIntegerDigits: 2,
-              useGrouping: false
-            });
-          };
-          stateReps[`cd${district}`] = doc.data();
-        });
-        reps.setItem(`${stateId}`, JSON.stringify(stateReps));
-      });
-  };
-}
-
 function fillDistricts() {
   var stateReps = JSON.parse(reps[stateId]);
   for (var key in stateReps) {
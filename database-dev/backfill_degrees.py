@@ -0,0 +1,15 @@
+from data_acq_functions import Auth
+from etl_functions import backfill_degrees, ensure_indexes
+
+def main():
+    # Config database
+    config = Auth('./auth/config.ini')
+    m_db = config.config_mongodb()
+    m_coll = m_db['reps']
+
+    # Normalize degrees of existing reps and index the new fields
+    backfill_degrees(m_coll)
+    print('Indexes:', ensure_indexes(m_coll))
+
+if __name__ == '__main__':
+    main()
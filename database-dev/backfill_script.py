@@ -0,0 +1,132 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from zlib import crc32
+
+from data_acq_functions import (
+    Auth, EntityResolver, get_chamber_ids, get_reps_concurrent, map_concurrent, merge_roles
+)
+from load_functions import Checkpoint, ChunkedWriter
+
+# Chambers listed per congress
+CHAMBERS = ['house', 'senate']
+
+# Maximum concurrent member requests per worker process
+MAX_WORKERS = 8
+
+# Members per bulk write
+CHUNK_SIZE = 50
+
+# Checkpoint journals of completed members (one per shard)
+CHECKPOINT_DIR = './checkpoints'
+
+CONFIG_FILE = '../database-dev/auth/config.ini'
+
+def list_members(transport, congresses, chambers):
+    '''
+    Function to list every (congress, chamber) concurrently, deduplicated into
+    member ID -> [(congress, chamber), ...]
+    '''
+
+    listings = [ (congress, chamber) for congress in congresses for chamber in chambers ]
+    results, errors = map_concurrent(
+        lambda listing: get_chamber_ids(*listing, transport), listings, MAX_WORKERS
+    )
+    for listing, error in errors.items():
+        print(f'Error listing {listing}: {error!r}')
+
+    members = {}
+    for listing in sorted(results):
+        for member_id in results[listing]:
+            members.setdefault(member_id, []).append(listing)
+
+    return members, errors
+
+def shard_of(member_id, shards):
+    # Stable across processes and runs (unlike hash())
+    return crc32(member_id.encode()) % shards
+
+def backfill_shard(shard, shards, member_ids, chunk_size=CHUNK_SIZE, restart=False):
+    '''
+    Function to fetch, enrich and upsert one shard of members in its own process,
+    merging fetched roles into stored roles and resuming from the shard journal
+    '''
+
+    # Clients are created per process (MongoClient and HTTP pools are not fork-safe)
+    config = Auth(CONFIG_FILE)
+    transport = config.config_transport(config.config_cache())
+    collection = config.config_mongodb()['reps']
+    clients = lambda: (config.config_gkg(), config.config_wiki())
+    resolver = EntityResolver(clients, config.config_resolution_cache())
+
+    checkpoint = Checkpoint(os.path.join(CHECKPOINT_DIR, f'backfill_{shard}of{shards}.journal'))
+    if restart:
+        checkpoint.remove()
+    remaining = [ member for member in member_ids if member not in checkpoint ]
+
+    errors = {}
+    with ChunkedWriter(collection, chunk_size, checkpoint) as writer:
+        for i in range(0, len(remaining), chunk_size):
+            chunk = remaining[i:i + chunk_size]
+            reps, chunk_errors = get_reps_concurrent(chunk, transport, clients, MAX_WORKERS, resolver)
+            errors.update(chunk_errors)
+
+            stored = {
+                doc['_id']: doc.get('roles', [])
+                for doc in collection.find({'_id': {'$in': list(reps)}}, {'roles': 1})
+            }
+            for member in chunk:
+                if member in reps:
+                    rep = reps[member]
+                    rep['roles'] = merge_roles(stored.get(member, []), rep['roles'])
+                    writer.add(rep)
+
+    if not errors and writer.totals['errors'] == 0:
+        checkpoint.remove()
+    resolver.close()
+    transport.close()
+
+    return dict(writer.totals, members=len(member_ids), skipped=len(member_ids) - len(remaining), failed=len(errors))
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill reps for a range of congresses and chambers')
+    parser.add_argument('--start', type=int, default=107, help='first congress (107: 2001-2003)')
+    parser.add_argument('--end', type=int, default=117, help='last congress, inclusive')
+    parser.add_argument('--chambers', nargs='+', choices=CHAMBERS, default=CHAMBERS)
+    parser.add_argument('--shards', type=int, default=4, help='total shards across all hosts')
+    parser.add_argument('--only', type=int, nargs='+', help='shard indexes run by this invocation (default: all)')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--restart', action='store_true', help='ignore the shard checkpoint journals')
+    args = parser.parse_args()
+
+    # Member lists for every congress and chamber, each member once
+    config = Auth(CONFIG_FILE)
+    transport = config.config_transport(config.config_cache())
+    members, _ = list_members(transport, range(args.start, args.end + 1), args.chambers)
+    transport.close()
+    listings = sum( len(listed) for listed in members.values() )
+    print(f'Listings: {listings}, unique members: {len(members)}')
+
+    # Partition members into stable shards
+    shards = args.only if args.only is not None else range(args.shards)
+    assigned = { shard: [] for shard in shards }
+    for member_id in sorted(members):
+        shard = shard_of(member_id, args.shards)
+        if shard in assigned:
+            assigned[shard].append(member_id)
+
+    with ProcessPoolExecutor(max_workers=min(args.processes, len(assigned))) as executor:
+        futures = {
+            executor.submit(backfill_shard, shard, args.shards, member_ids, args.chunk_size, args.restart): shard
+            for shard, member_ids in assigned.items()
+        }
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                print(f'Shard {shard}/{args.shards}: {future.result()}')
+            except Exception as e:
+                print(f'Shard {shard}/{args.shards} failed: {e!r}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+'''
+Cold import time of each script in a fresh interpreter (median of --repeat runs,
+from python -X importtime), and which heavy client libraries the import pulled in
+
+Usage (from database-dev):
+    python benchmarks/bench_import.py [--repeat 5] [MODULE ...]
+'''
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scripts timed by default
+MODULES = [
+    'build_db_script', 'backfill_script', 'edu_script', 'contributions_script',
+    'mongo_to_firestore', 'edu_to_firestore', 'party_gender_to_fs', 'states_to_firestore',
+]
+
+# Client libraries that should only be imported on first use
+HEAVY = ['googleapiclient', 'pymongo', 'firebase_admin', 'mediawiki', 'bs4', 'requests']
+
+def import_ms(module):
+    '''
+    Function to return a module's cumulative import time (ms) in a new interpreter
+    '''
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    for line in reversed(result.stderr.splitlines()):
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+
+    return None
+
+def heavy_imports(module):
+    code = f'import sys, {module}; print(" ".join( m for m in {HEAVY!r} if m in sys.modules ))'
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+    return result.stdout.split()
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold import time of the loader scripts')
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'module':24} {'import ms':>10}  heavy modules imported")
+    for module in args.modules:
+        times = [ import_ms(module) for _ in range(args.repeat) ]
+        heavy = heavy_imports(module)
+        print(f"{module:24} {statistics.median(times):10.1f}  {', '.join(heavy) or '-'}")
+
+if __name__ == '__main__':
+    main()
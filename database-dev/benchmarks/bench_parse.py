@@ -0,0 +1,99 @@
+'''
+Benchmark of education parsing over saved pages: full html.parser tree (before)
+vs lxml + targeted fragment parsing (after)
+
+Usage (from database-dev):
+    python benchmarks/bench_parse.py PAGES_DIR [--download URL ...]
+
+Saved pages are named wiki_<name>.html (Wikipedia articles) or vs_<name>.html
+(Vote Smart biographies).
+'''
+
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_acq_functions import HTML_PARSER, parse_vs_edu, parse_wiki_edu
+
+PARSERS = {
+    'wiki': parse_wiki_edu,
+    'vs': parse_vs_edu,
+}
+
+def download(urls, pages_dir):
+    '''
+    Function to save pages for the benchmark
+    '''
+
+    os.makedirs(pages_dir, exist_ok=True)
+    for url in urls:
+        prefix = 'wiki' if 'wikipedia.org' in url else 'vs'
+        name = url.rstrip('/').split('/')[-1]
+        with open(os.path.join(pages_dir, f'{prefix}_{name}.html'), 'wb') as f:
+            f.write(requests.get(url).content)
+
+def measure(parse, html, fast, repeat):
+    '''
+    Function to return (result, best seconds, peak bytes) of parsing a page
+    '''
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parse(html, fast)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse(html, fast)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, best, peak
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark education parsing over saved pages')
+    parser.add_argument('pages_dir')
+    parser.add_argument('--download', nargs='*', default=[], help='URLs to save before benchmarking')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.download:
+        download(args.download, args.pages_dir)
+
+    print(f'Fast parser backend: {HTML_PARSER}')
+    print(f"{'page':40} {'before ms':>10} {'after ms':>10} {'before KiB':>11} {'after KiB':>10}  same")
+    totals = [0, 0, 0, 0]
+    for path in sorted(glob.glob(os.path.join(args.pages_dir, '*.html'))):
+        name = os.path.basename(path)
+        parse = PARSERS.get(name.split('_')[0])
+        if parse is None:
+            continue
+        with open(path, 'rb') as f:
+            html = f.read()
+
+        try:
+            before, t_before, m_before = measure(parse, html, False, args.repeat)
+            after, t_after, m_after = measure(parse, html, True, args.repeat)
+        except Exception as e:
+            print(f'{name:40} error: {e!r}')
+            continue
+
+        totals = [ a + b for a, b in zip(totals, [t_before, t_after, m_before, m_after]) ]
+        print(
+            f'{name:40} {t_before * 1000:10.1f} {t_after * 1000:10.1f} '
+            f'{m_before / 1024:11.0f} {m_after / 1024:10.0f}  {before == after}'
+        )
+
+    print(
+        f"{'total':40} {totals[0] * 1000:10.1f} {totals[1] * 1000:10.1f} "
+        f'{totals[2] / 1024:11.0f} {totals[3] / 1024:10.0f}'
+    )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+'''
+End-to-end benchmark of build_db_script and the Firestore loaders against recorded
+fixtures (replay.ReplayServer), a local MongoDB and the Firestore emulator
+(mongomock lacks aggregation operators the loaders use, e.g. $convert and $round)
+
+Record fixtures once with live keys and an empty response cache (from database-dev):
+    python replay.py record --port 8765 &
+    REP_DB_PROXY=http://127.0.0.1:8765 python build_db_script.py
+    REP_DB_PROXY=http://127.0.0.1:8765 python edu_script.py
+
+Benchmark:
+    firebase emulators:start --only firestore   # optional, Firestore stages are skipped without it
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python benchmarks/bench_pipeline.py --latency 0.05
+'''
+
+import argparse
+import configparser
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from replay import ReplayServer
+
+# Config used when no base config is available (keys are not part of fixture keys)
+DEFAULT_CONFIG = {
+    'propublica': {'PROPUBLICA_API_KEY': 'replay', 'API_ROOT': 'https://api.propublica.org/congress/v1/'},
+    'gcpkeys': {'GKG_API_KEY': 'replay', 'GKG': 'kgsearch', 'GKG_VERSION': 'v1'},
+    'opensecrets': {'OPENSECRETS_API_KEY': 'replay', 'API_ROOT': 'https://www.opensecrets.org/api/'},
+}
+
+def write_config(base_config, mongo_uri, db_name, cache_dir, path):
+    '''
+    Function to write a benchmark config.ini (API roots from base config, local databases)
+    '''
+
+    config = configparser.ConfigParser()
+    config.read(base_config)
+    for section, values in DEFAULT_CONFIG.items():
+        if not config.has_section(section):
+            config[section] = values
+    config['mongodb'] = {'MONGO_LOCAL': mongo_uri, 'MONGO_DB': db_name}
+    config['cache'] = {'CACHE_DIR': cache_dir}
+    with open(path, 'w') as f:
+        config.write(f)
+
+def timed(report, stage, func, *args):
+    start = time.perf_counter()
+    docs = func(*args)
+    report.append((stage, time.perf_counter() - start, docs))
+
+    return docs
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end acquisition and loading benchmark')
+    parser.add_argument('--fixtures', default='./fixtures')
+    parser.add_argument('--config', default='./auth/config.ini', help='base config for API roots')
+    parser.add_argument('--congress', type=int, default=117)
+    parser.add_argument('--latency', type=float, default=0.0, help='injected seconds per upstream request')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='rep_db_bench_')
+    config_path = os.path.join(tmp, 'config.ini')
+    write_config(args.config, args.mongo_uri, 'rep_db_bench', os.path.join(tmp, 'cache'), config_path)
+
+    server = ReplayServer(args.fixtures, 'replay', 0, args.latency, args.jitter, args.error_rate).start()
+    os.environ['REP_DB_CONFIG'] = config_path
+    os.environ['REP_DB_PROXY'] = server.url
+
+    # Imported after the environment is set, scripts configure clients at import
+    import build_db_script
+    import mongo_to_firestore
+    import states_to_firestore
+
+    build_db_script.CHECKPOINT_DIR = os.path.join(tmp, 'checkpoints')
+    m_db = build_db_script.config.config_mongodb()
+    m_db.drop_collection('reps')
+    m_db.drop_collection('firestore_fingerprints')
+    collection = m_db['reps']
+
+    report = []
+    build = lambda: build_db_script.build(collection, args.congress, restart=True)['upserted']
+    timed(report, 'build_db_script', build)
+
+    if os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        f_db = build_db_script.config.config_firestore()
+        timed(report, 'mongo_to_firestore', mongo_to_firestore.load, m_db, f_db)
+        timed(report, 'states_to_firestore', states_to_firestore.load, m_db, f_db)
+    else:
+        print('FIRESTORE_EMULATOR_HOST not set, skipping Firestore loaders')
+
+    server.stop()
+
+    print(f"\n{'stage':24} {'seconds':>9} {'docs':>7} {'docs/s':>9}")
+    for stage, seconds, docs in report:
+        print(f'{stage:24} {seconds:9.2f} {docs:7d} {docs / seconds if seconds else 0:9.1f}')
+    print('Replay server:', server.stats)
+
+if __name__ == '__main__':
+    main()
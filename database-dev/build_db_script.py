@@ -1,58 +1,148 @@
-import configparser
-import pymongo
-from pymongo import InsertOne
+import argparse
+import os
 
-from googleapiclient.discovery import build
-from mediawiki import MediaWiki
+from data_acq_functions import (
+    Auth, EntityResolver, get_house_ids, get_member, iter_reps, map_concurrent,
+    member_hash, resolve_wiki_urls
+)
+from etl_functions import HOUSE_MATCH
+from load_functions import Checkpoint, ChunkedWriter
+from metrics import METRICS
 
-from data_acq_functions import get_house_ids, get_rep_data
+# Maximum concurrent member requests
+MAX_WORKERS = 8
 
-# Get config file
-config = configparser.ConfigParser()
-config.read('../database-dev/auth/config.ini')
+# Members per bulk write
+CHUNK_SIZE = 50
 
-# Get ProPublica config
-PROPUBLICA_KEY = config.get('propublica', 'PROPUBLICA_API_KEY')
-API_ROOT = config.get('propublica', 'API_ROOT')
-PROPUBLICA_HEADER = {'X-API-Key': f'{PROPUBLICA_KEY}'}
+# Checkpoint journals of completed members
+CHECKPOINT_DIR = './checkpoints'
 
-# Get API key for GKG
-GKG_API_KEY = config.get('gcpkeys', 'GKG_API_KEY')
-GKG = config.get('gcpkeys', 'GKG')
-GKG_VERSION = config.get('gcpkeys', 'GKG_VERSION')
+# Get config file (clients are created on first use)
+config = Auth('../database-dev/auth/config.ini')
 
-# Instantiate service connection
-service = build(GKG, GKG_VERSION, developerKey=GKG_API_KEY)
-entities = service.entities()
+def get_transport():
+    # Shared pooled HTTP transport with persistent response cache
+    return config.config_transport(config.config_cache())
 
-# Instantiate wikipedia object
-wikipedia = MediaWiki()
+def clients():
+    # Instantiate service connection and wikipedia object (one pair per worker thread)
+    entities = config.config_gkg()
+    wikipedia = config.config_wiki()
 
-# Get MongoDB config
-MONGO_LOCAL = config.get('mongodb', 'MONGO_LOCAL')
-MONGO_DB = config.get('mongodb', 'MONGO_DB')
-client = pymongo.MongoClient(MONGO_LOCAL)
+    return entities, wikipedia
 
-# Connect to database
-db = client.get_database(MONGO_DB)
+def get_resolver():
+    # Hedged, scored wikipedia URL resolution with cached positive and negative results
+    return EntityResolver(clients, config.config_resolution_cache())
+
+def build(collection, congress, chunk_size=CHUNK_SIZE, restart=False):
+    '''
+    Function to fetch and upsert every member of a house in chunks, resuming from the checkpoint journal
+    '''
+
+    transport = get_transport()
+    checkpoint = Checkpoint(os.path.join(CHECKPOINT_DIR, f'{congress}_house.journal'))
+    if restart:
+        checkpoint.remove()
+
+    # Get all house members of the congress, skipping members already written
+    members = get_house_ids(congress, transport)
+    remaining = [ member for member in members if member not in checkpoint ]
+    print(f'Members: {len(members)}, already written: {len(members) - len(remaining)}')
+
+    # Fetch members in parallel, streaming chunks to the collection
+    errors = {}
+    resolver = get_resolver()
+    with ChunkedWriter(collection, chunk_size, checkpoint) as writer:
+        for member, rep, error in iter_reps(remaining, transport, clients, MAX_WORKERS, chunk_size, resolver):
+            if error is not None:
+                errors[member] = error
+                print(f'Error retrieving {member}: {error!r}')
+            else:
+                writer.add(rep)
+
+    print(writer.totals)
+    resolver.close()
+
+    # Keep the journal only while members are outstanding
+    if not errors and writer.totals['errors'] == 0:
+        checkpoint.remove()
+
+    return writer.totals
+
+def sync(collection, congress):
+    '''
+    Function to enrich and upsert only new or changed members, marking members who left office
+    '''
+
+    # Current member list and ProPublica data
+    transport = get_transport()
+    member_ids = get_house_ids(congress, transport)
+    members, errors = map_concurrent(lambda m: get_member(m, transport), member_ids, MAX_WORKERS)
+
+    # Compare content hashes with stored members
+    stored = {
+        doc['_id']: doc.get('member_hash')
+        for doc in collection.find({'_id': {'$in': member_ids}}, {'member_hash': 1})
+    }
+    changed = []
+    for member in member_ids:
+        if member not in members:
+            continue
+        rep = members[member]
+        rep['member_hash'] = member_hash(rep)
+        if stored.get(member) != rep['member_hash']:
+            changed.append(member)
+    print(f'Members: {len(member_ids)}, new: {len(set(changed) - set(stored))}, changed: {len(set(changed) & set(stored))}')
+
+    # Enrich changed members only (GKG/MediaWiki)
+    resolver = get_resolver()
+    reps, enrich_errors = resolve_wiki_urls([ members[m] for m in changed ], clients, MAX_WORKERS, resolver)
+    resolver.close()
+    errors.update(enrich_errors)
+    for member, error in errors.items():
+        print(f'Error retrieving {member}: {error!r}')
+
+    # Upsert without touching fields added later (e.g. education)
+    with ChunkedWriter(collection, CHUNK_SIZE) as writer:
+        for member in changed:
+            if member in reps:
+                writer.add(reps[member])
+
+    # Mark House members who left office (senators from a backfill are not in the House list)
+    result = collection.update_many(
+        dict(HOUSE_MATCH, _id={'$nin': member_ids}),
+        {'$set': {'in_office': False}}
+    )
+    print(f'Members marked out of office: {result.modified_count}')
 
 def main():
-    # Instantiate connection to collection
-    collection = db['reps']
+    parser = argparse.ArgumentParser(description='Build or sync the reps collection')
+    parser.add_argument('--congress', type=int, default=117)
+    parser.add_argument('--sync', action='store_true', help='only enrich and upsert new or changed members')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint journal of a previous run')
+    parser.add_argument('--metrics-jsonl', help='write spans and metrics as JSON lines to this file')
+    parser.add_argument('--metrics-port', type=int, help='serve Prometheus metrics on this port')
+    args = parser.parse_args()
 
-    # Get all house members of the 117th congress
-    members = get_house_ids(117, API_ROOT, PROPUBLICA_HEADER)
+    if args.metrics_jsonl:
+        METRICS.set_sink(args.metrics_jsonl)
+    if args.metrics_port:
+        METRICS.serve(args.metrics_port)
 
-    # Insert statements
-    inserts = []
-    for member in members:
-        data = get_rep_data(member, API_ROOT, PROPUBLICA_HEADER, entities, wikipedia)
-        inserts.append(InsertOne(data))
+    # Instantiate connection to collection
+    collection = config.config_mongodb()['reps']
 
-    # Bulk write to collection
-    result = collection.bulk_write(inserts)
+    if args.sync:
+        sync(collection, args.congress)
+    else:
+        build(collection, args.congress, args.chunk_size, args.restart)
 
-    print(result.bulk_api_result)
+    # Run summary
+    METRICS.snapshot()
+    print(METRICS.summary())
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,92 @@
+import time
+
+from data_acq_functions import Auth, get_contributions, map_concurrent
+from etl_functions import HOUSE_MATCH, contribution_summaries
+from load_functions import ChunkedWriter, load_firestore
+from transport import BudgetExhausted
+
+# Maximum concurrent OpenSecrets requests
+MAX_WORKERS = 4
+
+# Contributions older than this are fetched again (seconds)
+REFRESH_AGE = 7 * 24 * 3600
+
+# Firestore collection for each rollup
+COLLECTIONS = {
+    'state': 'state_contributions',
+    'party': 'party_contributions',
+}
+
+def collect(m_db, transport):
+    '''
+    Function to fetch sector contributions for in-office reps with a crp_id, missing and
+    stalest first, within the remaining OpenSecrets daily budget (the rest waits for the next run)
+    '''
+
+    reps = {
+        rep['_id']: rep
+        for rep in m_db['reps'].find(
+            dict(HOUSE_MATCH, crp_id={'$nin': [None, '']}),
+            {'crp_id': 1, 'state': 1, 'current_party': 1}
+        )
+    }
+    contributions = m_db['contributions']
+    contributions.create_index('in_office')
+    fetched = { doc['_id']: doc.get('fetched_at', 0) for doc in contributions.find({}, {'fetched_at': 1}) }
+
+    now = time.time()
+    due = sorted(
+        ( member for member in reps if now - fetched.get(member, 0) > REFRESH_AGE ),
+        key=lambda member: fetched.get(member, 0)
+    )
+    remaining = transport.remaining(transport.opensecrets_root)
+    batch = due if remaining is None else due[:max(remaining, 0)]
+    print(f'Reps: {len(reps)}, due: {len(due)}, fetching today: {len(batch)}')
+
+    results, errors = map_concurrent(
+        lambda member: get_contributions(reps[member]['crp_id'], transport), batch, MAX_WORKERS
+    )
+    deferred = [ member for member, error in errors.items() if isinstance(error, BudgetExhausted) ]
+    for member, error in errors.items():
+        if not isinstance(error, BudgetExhausted):
+            print(f'Error retrieving contributions for {member}: {error!r}')
+    print(f'Fetched: {len(results)}, deferred (budget): {len(deferred) + len(due) - len(batch)}')
+
+    # Rep fields are refreshed for every rep, contributions only where fetched
+    with ChunkedWriter(contributions, 100) as writer:
+        for member, rep in reps.items():
+            doc = {
+                '_id': member,
+                'crp_id': rep['crp_id'],
+                'state': rep['state'],
+                'party': rep['current_party'],
+                'in_office': True,
+            }
+            if member in results:
+                doc.update(results[member], fetched_at=now)
+            writer.add(doc)
+    contributions.update_many({'_id': {'$nin': list(reps)}, 'in_office': True}, {'$set': {'in_office': False}})
+
+    return writer.totals
+
+def load(m_db, f_db):
+    fingerprints = m_db['firestore_fingerprints']
+
+    # Sector totals by state and party precomputed in one pass
+    summaries = contribution_summaries(m_db['contributions'])
+    for key, collection_name in COLLECTIONS.items():
+        total = load_firestore(f_db, collection_name, summaries[key], fingerprints=fingerprints)
+        print(f'{collection_name} Docs Loaded:', total)
+
+def main():
+    # Config transport and databases
+    config = Auth('./auth/config.ini')
+    transport = config.config_transport(config.config_cache())
+    m_db = config.config_mongodb()
+    f_db = config.config_firestore()
+
+    print(collect(m_db, transport))
+    load(m_db, f_db)
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,33 @@
-import requests
 import functools
+import os
+import hashlib
+import json
 import re
-import googleapiclient
-from googleapiclient.discovery import build
-import pymongo
-import mediawiki
+import sqlite3
+import threading
+import time
+import unicodedata
+from urllib.parse import unquote, urlsplit
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 import configparser
-from bs4 import BeautifulSoup
 
-# Wrapper for error logging
-def error_logging(func):
+from http_cache import ResponseCache
+from metrics import METRICS, instrumented
+from scheduler import RateScheduler, ScheduledEntities, ScheduledWiki, on_grant
+from transport import DailyBudget, Transport
+
+# Wrapper for error logging (latency, calls and errors per source recorded in metrics.METRICS)
+def error_logging(func=None, source='local'):
+    if func is None:
+        return functools.partial(error_logging, source=source)
+    timed_func = instrumented(source)(func)
+
     @functools.wraps(func)
     def wrapper_error(*args):
         data = None
         error = None
         try:
-            data = func(*args)
+            data = timed_func(*args)
         except Exception as e:
             error = type(e)
         return data, error
@@ -26,10 +38,57 @@ def error_logging(func):
 # Authentication and Config #
 #############################
 
+class ClientRegistry():
+    '''
+    Process-wide clients created once on first use, by key (per_thread: one client
+    per thread for clients that are not thread-safe, e.g. httplib2 and MediaWiki sessions)
+    '''
+
+    def __init__(self):
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def get(self, key, factory, per_thread=False):
+        if per_thread:
+            if not hasattr(self.local, 'clients'):
+                self.local.clients = {}
+            if key not in self.local.clients:
+                self.local.clients[key] = factory()
+            return self.local.clients[key]
+
+        with self.lock:
+            if key not in self.clients:
+                self.clients[key] = factory()
+
+        return self.clients[key]
+
+    def clear(self):
+        # Clients inherited through fork (MongoClient, sockets) are not reused in the child
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+CLIENTS = ClientRegistry()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=CLIENTS.clear)
+
+
 class Auth():
+    '''
+    Config and clients for every source (REP_DB_CONFIG overrides the config file,
+    REP_DB_PROXY routes HTTP sources through a replay.ReplayServer); clients come
+    from the process-wide CLIENTS registry, created on first use
+    '''
+
     def __init__(self, config_file):
+        self.config_file = os.path.abspath(os.environ.get('REP_DB_CONFIG', config_file))
         self.config = configparser.ConfigParser()
-        self.config.read(config_file)
+        self.config.read(self.config_file)
+        self.proxy = os.environ.get('REP_DB_PROXY')
+
+    def client(self, name, factory, per_thread=False):
+        return CLIENTS.get((self.config_file, self.proxy, name), factory, per_thread)
 
     def get_sections(self):
         return self.config.sections()
@@ -48,16 +107,26 @@ class Auth():
         return api_root, request_header
 
     def config_gkg(self):
-        api_key, gkg, version = self.get_configs('gcpkeys')
-        service = build(gkg, version, api_key)
-        entities = service.entities()
+        def factory():
+            from googleapiclient.discovery import build
+            api_key, gkg, version = self.get_configs('gcpkeys')
+            # Discovery document bundled with googleapiclient, no network fetch
+            client_options = {'api_endpoint': f'{self.proxy}/{gkg}.googleapis.com/'} if self.proxy else None
+            service = build(gkg, version, developerKey=api_key, static_discovery=True, client_options=client_options)
+            return ScheduledEntities(service.entities(), self.config_scheduler(), f'{gkg}.googleapis.com')
 
-        return entities
+        return self.client('gkg', factory, per_thread=True)
 
     def config_wiki(self):
-        wiki = mediawiki.MediaWiki()
+        def factory():
+            import mediawiki
+            if self.proxy:
+                wikipedia = mediawiki.MediaWiki(url=f'{self.proxy}/en.wikipedia.org/w/api.php')
+            else:
+                wikipedia = mediawiki.MediaWiki()
+            return ScheduledWiki(wikipedia, self.config_scheduler())
 
-        return wiki
+        return self.client('wiki', factory, per_thread=True)
 
     def config_opensecrets(self):
         api_key, api_root = self.get_configs('opensecrets')
@@ -65,36 +134,114 @@ class Auth():
         return api_key, api_root
 
     def config_mongodb(self):
+        def factory():
+            import pymongo
+            return pymongo.MongoClient(uri)
+
         uri, mongodb = self.get_configs('mongodb')
-        client = pymongo.MongoClient(uri)
+        client = self.client('mongodb', factory)
         db = client.get_database(mongodb)
 
         return db
 
+    def config_cache(self):
+        def factory():
+            cache_dir = self.config.get('cache', 'CACHE_DIR', fallback='./cache')
+            max_mb = self.config.getint('cache', 'MAX_MB', fallback=512)
+            return ResponseCache(cache_dir, max_bytes=max_mb * 2**20)
+
+        return self.client('cache', factory)
+
+    def config_transport(self, cache=None):
+        return self.client(('transport', id(cache)), lambda: self.make_transport(cache))
+
+    def make_transport(self, cache=None):
+        propublica = self.config_propublica()
+        opensecrets = None
+        budgets = {}
+        if self.config.has_section('opensecrets'):
+            opensecrets = self.config_opensecrets()
+            # Calls per day allowed by the OpenSecrets API key, shared by all runs
+            daily_limit = self.config.getint('opensecrets', 'DAILY_LIMIT', fallback=200)
+            budget_dir = self.config.get('cache', 'CACHE_DIR', fallback='./cache')
+            budgets[urlsplit(opensecrets[1]).netloc] = DailyBudget(os.path.join(budget_dir, 'budgets.db'), daily_limit)
+        transport = Transport(
+            propublica, opensecrets, cache, proxy=self.proxy, budgets=budgets, scheduler=self.config_scheduler()
+        )
+
+        return transport
+
+    def config_scheduler(self):
+        def factory():
+            # Optional [rates] section overrides per-host limits: host = rate,burst
+            rates = {}
+            if self.config.has_section('rates'):
+                for host, value in self.config.items('rates'):
+                    rate, burst = value.split(',')
+                    rates[host] = (float(rate), int(burst))
+            cache_dir = self.config.get('cache', 'CACHE_DIR', fallback='./cache')
+            return RateScheduler(os.path.join(cache_dir, 'scheduler.db'), rates)
+
+        return self.client('scheduler', factory)
+
+    def config_resolution_cache(self):
+        def factory():
+            cache_dir = self.config.get('cache', 'CACHE_DIR', fallback='./cache')
+            return ResolutionCache(os.path.join(cache_dir, 'resolutions.db'))
+
+        return self.client('resolutions', factory)
+
+    def config_firestore(self):
+        def factory():
+            # Firestore emulator (FIRESTORE_EMULATOR_HOST) needs no credentials
+            if os.environ.get('FIRESTORE_EMULATOR_HOST'):
+                from google.cloud import firestore
+                return firestore.Client(project=os.environ.get('GCLOUD_PROJECT', 'demo-rep-db'))
+
+            import firebase_admin
+            from firebase_admin import credentials, firestore
+            cert = self.get_configs('firebase')[0]
+            if not firebase_admin._apps:
+                firebase_admin.initialize_app(credentials.Certificate(cert))
+            return firestore.client()
+
+        return self.client('firestore', factory)
+
+
+
 
 ########################
 # ProPublica Functions #
 ########################
 
-def get_house_ids(congress, api_root, header):
+@instrumented('propublica')
+def get_chamber_ids(congress, chamber, transport):
     '''
-    Function to retrieve all member IDs for a particular house in congress
+    Function to retrieve all member IDs for a chamber ('house' or 'senate') in congress
     '''
     
-    call_string = api_root + f'{congress}/house/members.json'
-    r = requests.get(call_string, headers=header)
+    r = transport.propublica(f'{congress}/{chamber}/members.json')
+    r.raise_for_status()
     result = r.json()['results'][0]['members']
     member_ids = [ member['id'] for member in result ]
     
     return member_ids
 
-def get_mem_json(member, api_root, header):
+def get_house_ids(congress, transport):
+    '''
+    Function to retrieve all member IDs for a particular house in congress
+    '''
+    
+    return get_chamber_ids(congress, 'house', transport)
+
+@instrumented('propublica')
+def get_mem_json(member, transport):
     '''
     Function to retrieve JSON of particular member
     '''
 
-    call_string = api_root + f'members/{member}.json'
-    r = requests.get(call_string, headers=header)
+    r = transport.propublica(f'members/{member}.json')
+    r.raise_for_status()
     result = r.json()['results'][0]
     
     return result
@@ -106,9 +253,10 @@ def clean_role(role):
 
     role_dict = {
         'congress': role['congress'],
+        'chamber': role['chamber'],
         'state': role['state'],
         'party': role['party'],
-        'district': role['district'],
+        'district': role.get('district'), # Senate roles have no district
         'committees': [
             {'name': comm['name'], 'code': comm['code']}
             for comm in role['committees']
@@ -121,12 +269,25 @@ def clean_role(role):
     
     return role_dict
 
-def get_member(member_id, api_root, header):
+def merge_roles(*role_lists):
+    '''
+    Helper function to merge role lists into one per (congress, chamber), later lists
+    taking precedence, most recent congress first
+    '''
+
+    merged = {}
+    for roles in role_lists:
+        for role in roles:
+            merged[(role['congress'], role.get('chamber'))] = role
+
+    return sorted(merged.values(), key=lambda role: int(role['congress']), reverse=True)
+
+def get_member(member_id, transport):
     '''
     Function to get house member data as python dictionary
     '''
     
-    member = get_mem_json(member_id, api_root, header)
+    member = get_mem_json(member_id, transport)
     current = member['roles'][0]
     fec_id = current['fec_candidate_id'] # Most recent FEC candidate ID
     state = current['state'] # Most recent state represented
@@ -157,7 +318,10 @@ def get_member(member_id, api_root, header):
 # Google Knowledge Graph / MediaWiki Functions #
 ################################################
 
-@error_logging
+# Maximum entity IDs per Knowledge Graph request
+GKG_BATCH_SIZE = 25
+
+@error_logging(source='gkg')
 def get_wiki_url(rep, entities):
     '''
     Function to get wikipedia URL from Google Knowledge Graph with Google entity ID query
@@ -170,10 +334,49 @@ def get_wiki_url(rep, entities):
     
     return wiki_url
 
-@error_logging
+@instrumented('gkg')
+def get_wiki_urls(reps, entities, batch_size=GKG_BATCH_SIZE):
+    '''
+    Function to get wikipedia URLs for many reps with multi-id Google Knowledge Graph queries
+    (returns {google_id: wiki_url or None}, IDs without a result or in a failed batch are left
+    out so their reps go through the per-member fallbacks)
+    '''
+
+    from googleapiclient.errors import HttpError
+
+    ids = sorted({ rep['google_id'] for rep in reps if rep['google_id'] })
+    batches = [ ids[i:i + batch_size] for i in range(0, len(ids), batch_size) ]
+
+    wiki_urls = {}
+    while batches:
+        batch = batches.pop()
+        try:
+            r = entities.search(ids=batch, limit=len(batch)).execute()
+        except Exception as e:
+            if isinstance(e, HttpError) and e.resp.status == 400:
+                # Split batch to isolate malformed IDs
+                if len(batch) > 1:
+                    half = len(batch) // 2
+                    batches.extend([batch[:half], batch[half:]])
+                continue
+            # Quota, throttling (retries exhausted), 5xx, timeouts, connection errors:
+            # the batch's reps become misses
+            METRICS.inc('function_errors_total', function='get_wiki_urls', source='gkg', error=type(e).__name__)
+            METRICS.record_error(type(e).__name__, function='get_wiki_urls', source='gkg')
+            print(f'GKG batch of {len(batch)} IDs failed: {e!r}')
+            continue
+        for item in r.get('itemListElement', []):
+            result = item['result']
+            gid = re.search('(?<=:).*', result['@id'])[0]
+            wiki_urls[gid] = result.get('detailedDescription', {}).get('url')
+
+    return wiki_urls
+
+@error_logging(source='gkg')
 def gkg_search(rep, entities):
     '''
-    Function to get google_id and wikipedia URL from Google Knowledge Graph with search term query
+    Function to get google_id, wikipedia URL and description text from Google Knowledge Graph
+    with search term query
     '''
     
     query = f"{rep['first_name']} {rep['last_name']} politician"
@@ -185,60 +388,541 @@ def gkg_search(rep, entities):
         wiki_url = result['detailedDescription']['url']
     except:
         wiki_url = None
+    context = f"{result.get('description', '')} {result.get('detailedDescription', {}).get('articleBody', '')}"
     
-    return gid, wiki_url
+    return gid, wiki_url, context
 
-@error_logging
+@error_logging(source='mediawiki')
 def mediawiki_search(rep, wikipedia):
     '''
-    Function to get wikipedia URL from MediaWiki
+    Function to get wikipedia URL and lead sentences from MediaWiki
     '''
     
     query = f"{rep['first_name']} {rep['last_name']} politician"
-    wiki_url = wikipedia.page(query).url
+    page = wikipedia.page(query)
     
-    return wiki_url
+    return page.url, page.summarize(sentences=2)
+
+#####################
+# Entity Resolution #
+#####################
+
+# Seconds the primary source may take before fallbacks are fired speculatively
+LATENCY_BUDGET = 0.5
+
+# Seconds after which outstanding candidates are abandoned
+RESOLVE_DEADLINE = 10.0
+
+# Minimum name-match score of an accepted wikipedia URL: a surname alone (0.6, 0.7 with
+# "politician") is rejected, a first/middle name, nickname, initial or shortened first name
+# is required on top
+ACCEPT_SCORE = 0.75
+
+# Words of a search result's description (GKG) or lead (MediaWiki) tying it to a member of
+# Congress, required on top of the name match (a namesake is not accepted)
+OFFICE_TERMS = {'representative', 'representatives', 'congress', 'congressman', 'congresswoman', 'congressional'}
+
+# Title words disambiguating politicians' pages
+DISAMBIGUATION = {'politician', 'congressman', 'congresswoman'}
+
+# Resolution sources in priority order (scores within TIE_MARGIN go to the earlier source)
+SOURCES = ['gkg_id', 'gkg_search', 'mediawiki']
+TIE_MARGIN = 0.05
+
+# Common nicknames of formal first names (Bobby Scott is Robert Scott)
+NICKNAMES = {
+    'abigail': ['abby'], 'alexander': ['alex'], 'andrew': ['andy', 'drew'], 'anthony': ['tony'],
+    'benjamin': ['ben'], 'charles': ['chuck', 'charlie'], 'christopher': ['chris'], 'cynthia': ['cindy'],
+    'daniel': ['dan', 'danny'], 'david': ['dave'], 'deborah': ['debbie', 'deb'], 'donald': ['don'],
+    'douglas': ['doug'], 'edward': ['ed', 'eddie', 'ted'], 'elizabeth': ['liz', 'beth', 'betsy', 'betty'],
+    'frederick': ['fred'], 'gerald': ['jerry'], 'gregory': ['greg'], 'henry': ['hank'], 'james': ['jim', 'jimmy'],
+    'jennifer': ['jenny', 'jen'], 'john': ['jack'], 'jonathan': ['jon'], 'joseph': ['joe'], 'joshua': ['josh'],
+    'katherine': ['kathy', 'kate', 'katie'], 'kathleen': ['kathy'], 'kenneth': ['ken', 'kenny'],
+    'lawrence': ['larry'], 'margaret': ['peggy', 'maggie'], 'matthew': ['matt'], 'michael': ['mike'],
+    'nicholas': ['nick'], 'patricia': ['pat', 'patty'], 'patrick': ['pat'], 'peter': ['pete'],
+    'randall': ['randy'], 'raymond': ['ray'], 'rebecca': ['becky'], 'richard': ['rick', 'dick', 'rich'],
+    'robert': ['bob', 'bobby', 'rob'], 'ronald': ['ron'], 'samuel': ['sam'], 'stephen': ['steve'],
+    'steven': ['steve'], 'susan': ['sue'], 'theodore': ['ted'], 'thomas': ['tom', 'tommy'], 'timothy': ['tim'],
+    'victoria': ['vicki', 'vicky'], 'vincent': ['vince'], 'william': ['bill', 'billy', 'will'],
+}
+
+# Cached resolutions lifetime (seconds): found URLs, and members with no acceptable URL
+POSITIVE_TTL = 30 * 24 * 3600
+NEGATIVE_TTL = 24 * 3600
+
+def name_tokens(text):
+    # Lowercase ASCII words (García -> garcia)
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+    return re.findall('[a-z]+', text)
+
+def name_score(rep, wiki_url):
+    '''
+    Function to score a wikipedia URL by how well its title matches the rep's name (0 to 1):
+    last name 0.6 (0.4 partial), first/middle name or nickname 0.3 (0.2 initial or shortened,
+    Kai for Kaiali'i), politician disambiguation 0.1
+    '''
+
+    try:
+        title = set(name_tokens(wiki_title(wiki_url)))
+    except IndexError:
+        return 0.0
+    last = [ token for token in name_tokens(rep['last_name']) if len(token) > 1 ]
+    given = name_tokens(rep['first_name']) + name_tokens(rep.get('middle_name'))
+    names = set(given)
+    for name in given:
+        names.update(NICKNAMES.get(name, []))
+        names.update( formal for formal, nicks in NICKNAMES.items() if name in nicks )
+    rest = title - set(last) - DISAMBIGUATION
+
+    score = 0.0
+    if last and all( token in title for token in last ):
+        score += 0.6
+    elif any( token in title for token in last ):
+        score += 0.4
+    if rest & names:
+        score += 0.3
+    elif any( len(token) == 1 and token in { name[0] for name in given } for token in rest ):
+        score += 0.2
+    elif any( len(token) > 2 and len(name) > 2 and (name.startswith(token) or token.startswith(name))
+              for token in rest for name in given ):
+        score += 0.2
+    if title & DISAMBIGUATION:
+        score += 0.1
+
+    return round(min(score, 1.0), 2)
+
+def office_match(text):
+    '''
+    Function to check whether a description mentions a seat in Congress
+    '''
+
+    return bool(set(name_tokens(text)) & OFFICE_TERMS)
+
+
+class ResolutionCache():
+    '''
+    SQLite cache of resolved wikipedia URLs per member, positive and negative
+    (entries are invalidated when the member's name or ProPublica google_id, or the
+    acceptance rules, change)
+    '''
+
+    def __init__(self, path, positive_ttl=POSITIVE_TTL, negative_ttl=NEGATIVE_TTL):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS resolutions (member_id TEXT PRIMARY KEY, query TEXT, '
+            'google_id TEXT, wiki_url TEXT, score REAL, source TEXT, resolved_at REAL)'
+        )
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def query(rep):
+        return f"{rep['first_name']}|{rep['last_name']}|{rep['google_id']}|{ACCEPT_SCORE}|office"
+
+    def get(self, rep):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT query, google_id, wiki_url, score, source, resolved_at FROM resolutions WHERE member_id = ?',
+                (rep['_id'],)
+            ).fetchone()
+        if row is None or row[0] != self.query(rep):
+            return None
+        query, google_id, wiki_url, score, source, resolved_at = row
+        ttl = self.positive_ttl if wiki_url else self.negative_ttl
+        if time.time() - resolved_at > ttl:
+            return None
+
+        return {'google_id': google_id, 'wiki_url': wiki_url, 'score': score, 'source': source}
+
+    def set(self, rep, candidate):
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO resolutions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    rep['_id'], self.query(rep), candidate['google_id'], candidate['wiki_url'],
+                    candidate['score'], candidate['source'], time.time()
+                )
+            )
+            self.conn.commit()
+
+
+class EntityResolver():
+    '''
+    Wikipedia URL resolution for reps: the primary source (GKG entity ID) gets a latency
+    budget, then the GKG search and MediaWiki fallbacks are fired speculatively; candidates
+    answering before the deadline are scored by name match (search results must also
+    mention Congress) and the best acceptable one wins, near ties by source priority
+    (clients: callable returning (entities, wikipedia) for the calling thread,
+    hedge=False tries sources one after another in the caller's thread)
+    '''
+
+    def __init__(self, clients, cache=None, budget=LATENCY_BUDGET, deadline=RESOLVE_DEADLINE,
+                 accept=ACCEPT_SCORE, hedge=True, max_workers=16):
+        self.clients = clients
+        self.cache = cache
+        self.budget = budget
+        self.deadline = deadline
+        self.accept = accept
+        self.executor = ThreadPoolExecutor(max_workers=max_workers) if hedge else None
+
+    def candidate(self, source, rep, granted=None):
+        '''
+        Function to query one source, returning a scored candidate or None
+        (granted: optional threading.Event set once the scheduler grants the query's token)
+        '''
+
+        entities, wikipedia = self.clients()
+        if granted is not None and not hasattr(entities, 'scheduler'):
+            granted.set() # Unscheduled client, no token to wait for
+        try:
+            with on_grant(granted.set if granted is not None else None):
+                if source == 'gkg_id':
+                    google_id = rep['google_id']
+                    wiki_url, error = get_wiki_url(rep, entities)
+                    context = None
+                elif source == 'gkg_search':
+                    data, error = gkg_search(rep, entities)
+                    google_id, wiki_url, context = data or (None, None, None)
+                else:
+                    google_id = None
+                    data, error = mediawiki_search(rep, wikipedia)
+                    wiki_url, context = data or (None, None)
+        finally:
+            if granted is not None:
+                granted.set()
+        if source == 'gkg_id' and (error is not None or not wiki_url):
+            # Failed primary, recorded so a gkg_search google_id may replace ProPublica's
+            return {'google_id': google_id, 'wiki_url': None, 'score': 0.0, 'source': source, 'verified': True}
+        if error is not None:
+            return None
+        if not wiki_url:
+            # A corrected google_id from gkg_search is kept even without a URL
+            if source == 'gkg_search' and google_id:
+                return {'google_id': google_id, 'wiki_url': None, 'score': 0.0, 'source': source, 'verified': False}
+            return None
+
+        # ProPublica's entity ID identifies the member, search results must mention Congress
+        verified = source == 'gkg_id' or office_match(context)
+
+        return {
+            'google_id': google_id, 'wiki_url': wiki_url, 'score': name_score(rep, wiki_url),
+            'source': source, 'verified': verified
+        }
+
+    def best(self, candidates):
+        '''
+        Function to pick the highest scoring candidate with a URL (acceptable ones first),
+        near ties going to the higher priority source
+        '''
+
+        candidates = [ c for c in candidates if c is not None and c['wiki_url'] ]
+        candidates = [ c for c in candidates if self.accepted(c) ] or candidates
+        if not candidates:
+            return None
+        top = max( c['score'] for c in candidates )
+        close = [ c for c in candidates if top - c['score'] <= TIE_MARGIN ]
+
+        return min(close, key=lambda c: SOURCES.index(c['source']))
+
+    def corrected_id(self, candidates, best):
+        '''
+        Helper function to return the gkg_search google_id replacing ProPublica's, only when
+        the ID lookup failed or its URL was rejected (a primary still outstanding at the
+        deadline keeps ProPublica's): kept when gkg_search found no URL, dropped when its
+        URL was rejected
+        '''
+
+        primary = next(( c for c in candidates if c is not None and c['source'] == 'gkg_id' ), None)
+        if primary is None or self.accepted(primary):
+            return None
+        for c in candidates:
+            if c is not None and c['source'] == 'gkg_search' and c['google_id']:
+                if c['wiki_url'] is None or c is best:
+                    return c['google_id']
+
+        return None
+
+    def accepted(self, candidate):
+        return candidate is not None and candidate['score'] >= self.accept and candidate['verified']
+
+    def gather(self, rep, sources):
+        '''
+        Function to collect candidates from sources until the deadline, returning early on
+        an acceptable primary
+        '''
+
+        candidates = []
+        if self.executor is None:
+            for i, source in enumerate(sources):
+                if i > 0 or source != 'gkg_id':
+                    METRICS.inc('fallbacks_total', fallback=source)
+                candidates.append(self.candidate(source, rep))
+                if self.accepted(candidates[-1]):
+                    break
+            return candidates
+
+        def primary_accepted():
+            return any( self.accepted(c) and c['source'] == 'gkg_id' for c in candidates )
+
+        start = time.perf_counter()
+        pending = set()
+        queued = list(sources)
+        if queued[0] == 'gkg_id':
+            # Primary alone within its latency budget, counted from its token grant
+            # (throttling waits are not a slow primary)
+            granted = threading.Event()
+            pending.add(self.executor.submit(self.candidate, queued.pop(0), rep, granted))
+            granted.wait(self.deadline)
+            done, pending = wait(pending, timeout=self.budget)
+            candidates += [ future.result() for future in done ]
+            if primary_accepted():
+                return candidates
+            METRICS.inc('resolution_hedges_total', reason='timeout' if pending else 'rejected')
+
+        for source in queued:
+            METRICS.inc('fallbacks_total', fallback=source)
+            pending.add(self.executor.submit(self.candidate, source, rep))
+        # Every candidate answering before the deadline competes in best()
+        while pending and not primary_accepted():
+            remaining = self.deadline - (time.perf_counter() - start)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            candidates += [ future.result() for future in done ]
+
+        return candidates
+
+    def resolve(self, rep, wiki_urls=None):
+        '''
+        Function to add wikipedia URL (and corrected google_id) to representative data
+        (wiki_urls: optional get_wiki_urls result standing in for the primary source)
+        '''
+
+        cached = self.cache.get(rep) if self.cache is not None else None
+        if cached is not None:
+            METRICS.inc('resolution_cache_total', result='positive' if cached['wiki_url'] else 'negative')
+            return self.apply(rep, cached)
+
+        sources = list(SOURCES)
+        candidates = []
+        if wiki_urls is not None:
+            sources.remove('gkg_id')
+            url = wiki_urls.get(rep['google_id'])
+            candidates.append({
+                'google_id': rep['google_id'], 'wiki_url': url, 'score': name_score(rep, url) if url else 0.0,
+                'source': 'gkg_id', 'verified': True
+            })
+        if not any( self.accepted(c) for c in candidates ):
+            candidates += self.gather(rep, sources)
+
+        best = self.best(candidates)
+        if not self.accepted(best):
+            METRICS.inc('resolution_rejected_total')
+            METRICS.record_error('NoAcceptableCandidate', function='resolve', source='wikipedia')
+            best = {
+                'google_id': None, 'wiki_url': None,
+                'score': best['score'] if best else 0.0, 'source': best['source'] if best else None
+            }
+        best = dict(best, google_id=self.corrected_id(candidates, best) or best['google_id'] or rep['google_id'])
+        if self.cache is not None:
+            self.cache.set(rep, best)
+
+        return self.apply(rep, best)
+
+    def apply(self, rep, candidate):
+        if candidate['google_id']:
+            rep['google_id'] = candidate['google_id']
+        rep['wiki_url'] = candidate['wiki_url']
+        rep['wiki_score'] = candidate['score']
+        rep['wiki_source'] = candidate['source']
 
-def get_rep_data(member_id, api_root, header, entities, wikipedia):
+        return rep
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+
+def member_hash(rep):
+    '''
+    Function to fingerprint ProPublica member data (get_member result) for change detection
+    '''
+
+    raw = json.dumps(rep, sort_keys=True, default=str)
+
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def get_rep_data(member_id, transport, entities, wikipedia, resolver=None):
     '''
     Function to retrieve data for US Representative
+    (resolver: optional EntityResolver, sources are tried one after another otherwise)
     '''
     
-    # Retrieve from ProPublica representative JSON
-    rep = get_member(member_id, api_root, header) # Outside function
-    
-    # Initial attempt to retrieve wikipedia URL
-    wiki_url, error = get_wiki_url(rep, entities) # Outside function
-    rep['wiki_url'] = wiki_url
-    
-    # Missing or wrong google_id in ProPublica data
-    if (error == googleapiclient.errors.HttpError) or (error == IndexError):
-        data, error = gkg_search(rep, entities) # Outside function
-        gid = data[0]
-        wiki_url = data[1]
-        rep['google_id'] = gid
-        rep['wiki_url'] = wiki_url
-        
-    # Missing wikipedia URL in Google Knowledge Graph
-    if (error == KeyError) or (rep['wiki_url'] == None):
-        wiki_url, error = mediawiki_search(rep, wikipedia) # Outside function
-        rep['wiki_url'] = wiki_url
+    if resolver is None:
+        resolver = EntityResolver(lambda: (entities, wikipedia), hedge=False)
+
+    with METRICS.span('member', member_id=member_id):
+        # Retrieve from ProPublica representative JSON
+        rep = get_member(member_id, transport) # Outside function
+        rep['member_hash'] = member_hash(rep)
         
-    return rep
+        return resolver.resolve(rep)
+
+def map_concurrent(func, items, max_workers=8, clients=None):
+    '''
+    Function to apply func to items with a bounded worker pool, returning results and errors keyed by item
+    (clients: optional callable called once per worker thread, its result is passed as func's last argument)
+    '''
+
+    # Google API client (httplib2) and MediaWiki session are not thread-safe
+    local = threading.local()
+
+    def call(item):
+        if clients is None:
+            return func(item)
+        if not hasattr(local, 'clients'):
+            local.clients = clients()
+        return func(item, local.clients)
+
+    results = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = { executor.submit(call, item): item for item in items }
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                errors[item] = e
+
+    return results, errors
+
+def resolve_wiki_urls(reps, clients, max_workers=8, resolver=None):
+    '''
+    Function to add wikipedia URLs to many reps: batched GKG ID lookups first (accepted
+    when the URL matches the rep's name), then hedged, scored fallbacks for the rest
+    (resolver: optional EntityResolver, e.g. with a ResolutionCache)
+    '''
+
+    own_resolver = resolver is None
+    if own_resolver:
+        resolver = EntityResolver(clients)
+
+    # Cached resolutions need no GKG lookup
+    results = {}
+    pending = []
+    for rep in reps:
+        cached = resolver.cache.get(rep) if resolver.cache is not None else None
+        if cached is not None:
+            METRICS.inc('resolution_cache_total', result='positive' if cached['wiki_url'] else 'negative')
+            results[rep['_id']] = resolver.apply(rep, cached)
+        else:
+            pending.append(rep)
+
+    entities, wikipedia = clients()
+    wiki_urls = get_wiki_urls(pending, entities)
+
+    misses = {}
+    for rep in pending:
+        url = wiki_urls.get(rep['google_id'])
+        score = name_score(rep, url) if url else 0.0
+        if score >= resolver.accept:
+            candidate = {'google_id': rep['google_id'], 'wiki_url': url, 'score': score, 'source': 'gkg_id', 'verified': True}
+            if resolver.cache is not None:
+                resolver.cache.set(rep, candidate)
+            results[rep['_id']] = resolver.apply(rep, candidate)
+        else:
+            misses[rep['_id']] = rep
+
+    METRICS.inc('gkg_batch_hits_total', len(pending) - len(misses))
+    METRICS.inc('gkg_batch_misses_total', len(misses))
+
+    def resolve(member_id):
+        with METRICS.span('resolve', member_id=member_id):
+            return resolver.resolve(misses[member_id], wiki_urls)
+
+    fallbacks, errors = map_concurrent(resolve, list(misses), max_workers)
+    results.update(fallbacks)
+    if own_resolver:
+        resolver.close()
+
+    return results, errors
+
+def get_reps_concurrent(member_ids, transport, clients, max_workers=8, resolver=None):
+    '''
+    Function to retrieve data for many US Representatives with a bounded worker pool
+    (clients: callable returning (entities, wikipedia) for the calling thread)
+    '''
+
+    def fetch(member_id):
+        with METRICS.span('member', member_id=member_id):
+            rep = get_member(member_id, transport)
+            rep['member_hash'] = member_hash(rep)
+            return rep
+
+    members, errors = map_concurrent(fetch, member_ids, max_workers)
+    reps, resolve_errors = resolve_wiki_urls(list(members.values()), clients, max_workers, resolver)
+    errors.update(resolve_errors)
+
+    return reps, errors
+
+def iter_reps(member_ids, transport, clients, max_workers=8, chunk_size=50, resolver=None):
+    '''
+    Generator of (member_id, rep, error) fetched chunk by chunk with get_reps_concurrent,
+    keeping memory flat for large member lists
+    '''
+
+    for i in range(0, len(member_ids), chunk_size):
+        chunk = member_ids[i:i + chunk_size]
+        reps, errors = get_reps_concurrent(chunk, transport, clients, max_workers, resolver)
+        for member_id in chunk:
+            yield member_id, reps.get(member_id), errors.get(member_id)
 
 
 ################################
 # Educational Scrape Functions #
 ################################
 
-@error_logging
-def wiki_edu_scrape(wiki_url):
+# Optional fast parser backend (pure-Python html.parser otherwise)
+try:
+    import lxml
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# Fragments parsed in fast mode (SoupStrainer arguments)
+INFOBOX_STRAINER = (('table',), {'attrs': {'class': re.compile(r'\binfobox\b')}})
+ANCHOR_STRAINER = (('a',), {})
+
+# Vote Smart biography cards (Education is one collapsible card among a few)
+VS_CARD_STRAINER = (('div',), {'attrs': {'class': re.compile(r'\bcard\b')}})
+
+# Institution names in Vote Smart education entries
+INSTITUTION_PATTERN = re.compile('(?=.*College)|(?=.*University)|(?=.*School)|(?=.*Institute)')
+
+def make_soup(html, features, strainer=None):
     '''
-    Function to scrape wikipedia by "Education" or "Alma mater" table row
+    Helper function to parse HTML with BeautifulSoup (bs4 imported on first parse)
     '''
-    
-    r = requests.get(wiki_url).text
-    soup = BeautifulSoup(r, features="html.parser")
+
+    from bs4 import BeautifulSoup, SoupStrainer
+    parse_only = SoupStrainer(*strainer[0], **strainer[1]) if strainer else None
+
+    return BeautifulSoup(html, features=features, parse_only=parse_only)
+
+def parse_wiki_edu(html, fast=True):
+    '''
+    Function to parse "Education" or "Alma mater" table row from wikipedia HTML
+    (fast: lxml backend parsing only infobox tables)
+    '''
+
+    if fast:
+        soup = make_soup(html, HTML_PARSER, INFOBOX_STRAINER)
+    else:
+        soup = make_soup(html, "html.parser")
     box = soup.find('table', attrs={'class': 'infobox vcard'})
     try:
         edus = box.find('th', text='Education').next_sibling
@@ -249,15 +933,26 @@ def wiki_edu_scrape(wiki_url):
     
     return edu
 
-@error_logging
-def get_vs_id(rep):
+@error_logging(source='wikipedia')
+def wiki_edu_scrape(wiki_url, transport):
+    '''
+    Function to scrape wikipedia by "Education" or "Alma mater" table row
+    '''
+    
+    # Infobox sits in the lead section, stop streaming at the first section heading
+    r = transport.get_html(wiki_url, stop='mw-heading2').text
+    
+    return parse_wiki_edu(r)
+
+@error_logging(source='votesmart')
+def get_vs_id(rep, transport):
     '''
     Function to retrieve missing Vote Smart ID with query
     '''
     
     call_string = f'https://votesmart.org/search?q={rep["first_name"]}+{rep["last_name"]}'
-    r = requests.get(call_string).text
-    soup = BeautifulSoup(r)
+    r = transport.get(call_string, lane='scrape').text
+    soup = make_soup(r, HTML_PARSER, ANCHOR_STRAINER)
     anchors = soup.find_all('a')
     for a in anchors:
         if a.text == f'{rep["first_name"]} {rep["last_name"]}':
@@ -266,18 +961,21 @@ def get_vs_id(rep):
     
     return _id
 
-@error_logging
-def vs_edu_scrape(rep):
+def parse_vs_edu(html, fast=True):
     '''
-    Function to scrape Vote Smart by "Education" <b> element
+    Function to parse Vote Smart biography HTML by "Education" <b> element
+    (fast: lxml backend parsing only the biography cards, whole page if none holds Education)
     '''
-    
-    url = 'https://justfacts.votesmart.org/candidate/biography/' + rep['votesmart_id']
-    r = requests.get(url).content
-    soup = BeautifulSoup(r)
+
+    if fast:
+        label = make_soup(html, HTML_PARSER, VS_CARD_STRAINER).find('b', text='Education')
+        if label is None:
+            label = make_soup(html, HTML_PARSER).find('b', text='Education')
+    else:
+        label = make_soup(html, "html.parser").find('b', text='Education')
 
     # Collapsable card object
-    edu_card = soup.find('b', text='Education').parent.parent.parent
+    edu_card = label.parent.parent.parent
     
     # Education paragraph objects
     edu = [ p.text for p in edu_card.find_all('p') ]
@@ -288,8 +986,7 @@ def vs_edu_scrape(rep):
         if len(entry[0]) < 5:
             degree = entry[0]
             for s in entry[1:]:
-                pattern = '(?=.*College)|(?=.*University)|(?=.*School)|(?=.*Institute)'
-                if re.search(pattern, s):
+                if INSTITUTION_PATTERN.search(s):
                     institution = s.strip()
                     edus.append([degree, institution])
     
@@ -298,6 +995,169 @@ def vs_edu_scrape(rep):
     else:
         return None
 
+@error_logging(source='votesmart')
+def vs_edu_scrape(rep, transport):
+    '''
+    Function to scrape Vote Smart by "Education" <b> element
+    '''
+    
+    url = 'https://justfacts.votesmart.org/candidate/biography/' + rep['votesmart_id']
+    r = transport.get(url, lane='scrape').content
+    
+    return parse_vs_edu(r)
+
+# Maximum titles per MediaWiki API query
+WIKI_BATCH_SIZE = 50
+
+# Wikilinks: [[target]] or [[target|text]]
+WIKILINK_PATTERN = re.compile(r'\[\[([^\[\]|]+)(?:\|([^\[\]]*))?\]\]')
+
+def wiki_title(wiki_url):
+    '''
+    Function to convert a wikipedia URL to its page title
+    '''
+
+    path = urlsplit(wiki_url).path
+    title = unquote(path.split('/wiki/', 1)[1]).replace('_', ' ')
+
+    return title
+
+@instrumented('wikipedia')
+def get_wiki_infoboxes(wiki_urls, transport, batch_size=WIKI_BATCH_SIZE):
+    '''
+    Function to retrieve the lead section wikitext (where the infobox sits) of many wikipedia
+    pages with batched MediaWiki API queries, following redirects in the same call
+    (returns {wiki_url: wikitext or None})
+    '''
+
+    # Group titles by wiki (API endpoint)
+    titles = {}
+    for url in set(wiki_urls):
+        parts = urlsplit(url)
+        api = f'{parts.scheme}://{parts.netloc}/w/api.php'
+        titles.setdefault(api, {}).setdefault(wiki_title(url), []).append(url)
+
+    wikitexts = { url: None for url in wiki_urls }
+    for api, urls_by_title in titles.items():
+        batch_titles = sorted(urls_by_title)
+        for i in range(0, len(batch_titles), batch_size):
+            batch = batch_titles[i:i + batch_size]
+            params = {
+                'action': 'query',
+                'prop': 'revisions',
+                'rvprop': 'content',
+                'rvslots': 'main',
+                # Section 0 only: lead and infobox, not the full article
+                'rvsection': 0,
+                'titles': '|'.join(batch),
+                'redirects': 1,
+                'format': 'json',
+                'formatversion': 2,
+            }
+            pages = {}
+            aliases = {}
+            cont = {}
+            while True:
+                result = transport.get(api, params=dict(params, **cont)).json()
+                query = result.get('query', {})
+                for alias in query.get('normalized', []) + query.get('redirects', []):
+                    aliases[alias['from']] = alias['to']
+                for page in query.get('pages', []):
+                    revisions = page.get('revisions')
+                    if revisions:
+                        pages[page['title']] = revisions[0]['slots']['main']['content']
+                if 'continue' not in result:
+                    break
+                cont = result['continue']
+
+            # Map requested titles through normalization/redirects back to URLs
+            for title in batch:
+                resolved = title
+                while resolved in aliases and aliases[resolved] != resolved:
+                    resolved = aliases[resolved]
+                for url in urls_by_title[title]:
+                    wikitexts[url] = pages.get(resolved)
+
+    return wikitexts
+
+def infobox_params(wikitext):
+    '''
+    Function to split the first infobox template of wikitext into {param: value}
+    '''
+
+    start = wikitext.lower().find('{{infobox')
+    if start == -1:
+        return None
+
+    params = {}
+    depth = 0
+    part = []
+    parts = []
+    i = start
+    while i < len(wikitext):
+        pair = wikitext[i:i + 2]
+        if pair in ('{{', '[['):
+            depth += 1
+            part.append(pair)
+            i += 2
+            continue
+        if pair in ('}}', ']]'):
+            depth -= 1
+            if depth == 0:
+                parts.append(''.join(part))
+                break
+            part.append(pair)
+            i += 2
+            continue
+        if wikitext[i] == '|' and depth == 1:
+            parts.append(''.join(part))
+            part = []
+        else:
+            part.append(wikitext[i])
+        i += 1
+
+    for p in parts[1:]:
+        key, sep, value = p.partition('=')
+        if sep:
+            params[key.strip().lower()] = value.strip()
+
+    return params
+
+def parse_infobox_edu(wikitext):
+    '''
+    Function to parse "education" or "alma_mater" infobox parameter from wikitext
+    (link texts, same shape as wiki_edu_scrape)
+    '''
+
+    params = infobox_params(wikitext)
+    value = params.get('education') or params.get('alma_mater')
+
+    edu = []
+    for target, text in WIKILINK_PATTERN.findall(value):
+        if ':' in target:
+            continue # File:, Category:, etc.
+        edu.append((text or target).strip())
+
+    return edu
+
+def get_wiki_edus(wiki_urls, transport, batch_size=WIKI_BATCH_SIZE):
+    '''
+    Function to retrieve wikipedia education entries of many pages in bulk
+    (returns {wiki_url: edu} and {wiki_url: error})
+    '''
+
+    wikitexts = get_wiki_infoboxes(wiki_urls, transport, batch_size)
+
+    edus = {}
+    errors = {}
+    for url, wikitext in wikitexts.items():
+        try:
+            edus[url] = parse_infobox_edu(wikitext)
+        except Exception as e:
+            errors[url] = type(e)
+
+    return edus, errors
+
 @error_logging
 def clean_edu(rep):
     '''
@@ -306,18 +1166,15 @@ def clean_edu(rep):
     
     edu = rep['education']
     
+    # Single pass: each degree is paired with the latest institution before it
     edu_list = []
-    for i in range(len(edu)):
-        institute = None
-        degree = None
-        if len(edu[i]) < 10:
-            degree = edu[i]
-            degree = ''.join(degree.split('.')).upper()
-            for j in range(i-1, -1, -1):
-                if len(edu[j]) >= 10:
-                    institute = edu[j]
-                    edu_list.append([degree, institute])
-                    break
+    institute = None
+    for entry in edu:
+        if len(entry) >= 10:
+            institute = entry
+        elif institute is not None:
+            degree = ''.join(entry.split('.')).upper()
+            edu_list.append([degree, institute])
 
     return edu_list
 
@@ -326,25 +1183,40 @@ def clean_edu(rep):
 # Open Secrets Functions #
 ##########################
 
-def get_contributions(crp_id, opensec_root, opensec_key):
-    url = opensec_root
-    headers = {
+@instrumented('opensecrets')
+def get_contributions(crp_id, transport):
+    '''
+    Function to retrieve contributions by sector for a candidate's latest cycle
+    (amounts converted from the API's strings to integers)
+    '''
+
+    params = {
         'method': 'candSector',
         'cid': crp_id,
-        'output': 'json',
-        'apikey': opensec_key
+        'output': 'json'
     }
-    r = requests.get(url, params=headers)
-    result = r.json()['response']['sectors']['sector']
+    r = transport.opensecrets(params)
+    r.raise_for_status()
+    response = r.json()['response']['sectors']
+    result = response['sector']
+    if isinstance(result, dict): # Single sector is not wrapped in a list
+        result = [result]
     
     sectors = []
     for sector in result:
         contribution_dict = {
             'sector': sector['@attributes']['sector_name'],
-            'individual': sector['@attributes']['indivs'],
-            'pacs': sector['@attributes']['pacs'],
-            'total': sector['@attributes']['total']
+            'individual': int(float(sector['@attributes']['indivs'])),
+            'pacs': int(float(sector['@attributes']['pacs'])),
+            'total': int(float(sector['@attributes']['total']))
         }
         sectors.append(contribution_dict)
     
-    return sectors
\ No newline at end of file
+    contributions = {
+        'cycle': int(response['@attributes']['cycle']),
+        'last_updated': response['@attributes'].get('last_updated'),
+        'sectors': sectors,
+        'total': sum( sector['total'] for sector in sectors )
+    }
+
+    return contributions
@@ -0,0 +1,124 @@
+import os
+import pickle
+
+import numpy as np
+import shapely
+from shapely.strtree import STRtree
+
+# Persisted locator (built once from the cd116 shapefile)
+INDEX_PATH = './geo/districts.pkl'
+
+# cd116 codes of single-district states and DC, stored as 'At-Large' in rep roles
+AT_LARGE_CODES = {'00', '98'}
+
+def role_district(code):
+    '''
+    Helper function to convert a cd116 code to the district stored in reps' roles
+    '''
+
+    if code in AT_LARGE_CODES:
+        return 'At-Large'
+    return str(int(code))
+
+
+class DistrictLocator():
+    '''
+    STR-tree spatial index over congressional district polygons answering
+    point queries (lon, lat in the shapefile's coordinates) with (state, cd116 code)
+    '''
+
+    def __init__(self, geometries, states, districts):
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.states = np.asarray(states, dtype=object)
+        self.districts = np.asarray(districts, dtype=object)
+        self.tree = STRtree(self.geometries)
+
+    def __getstate__(self):
+        # Geometries are persisted, the tree is rebuilt on load (milliseconds for 437 districts)
+        return {'geometries': self.geometries, 'states': self.states, 'districts': self.districts}
+
+    def __setstate__(self, state):
+        self.__init__(state['geometries'], state['states'], state['districts'])
+
+    @classmethod
+    def from_shapefile(cls, cd_shapefile=None, state_shapefile=None):
+        # geopandas only needed to build the index, not to query it
+        from geo_functions import CD_SHAPEFILE, STATE_SHAPEFILE, load_districts
+        df = load_districts(cd_shapefile or CD_SHAPEFILE, state_shapefile or STATE_SHAPEFILE)
+        df = df.to_crs('EPSG:4326')
+
+        return cls(df.geometry.values, df['state_abbr'].values, df['cd116'].values)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def locate_many(self, lons, lats):
+        '''
+        Function to locate many points at once, returning (states, districts) arrays
+        (None where a point is outside every district)
+        '''
+
+        points = shapely.points(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        point_idx, district_idx = self.tree.query(points, predicate='intersects')
+
+        states = np.full(len(points), None, dtype=object)
+        districts = np.full(len(points), None, dtype=object)
+        # Points on a shared boundary match twice, the first match is kept
+        first, keep = np.unique(point_idx, return_index=True)
+        states[first] = self.states[district_idx[keep]]
+        districts[first] = self.districts[district_idx[keep]]
+
+        return states, districts
+
+    def locate(self, lon, lat):
+        states, districts = self.locate_many([lon], [lat])
+        if states[0] is None:
+            return None
+
+        return states[0], districts[0]
+
+
+def district_reps(collection):
+    '''
+    Function to map (state, district as in roles) to in-office House reps
+    '''
+
+    from etl_functions import HOUSE_MATCH
+    projection = {'first_name': 1, 'last_name': 1, 'current_party': 1, 'state': 1, 'roles': {'$slice': 1}}
+    reps = {}
+    for rep in collection.find(HOUSE_MATCH, projection):
+        if rep.get('roles'):
+            reps[(rep['state'], str(rep['roles'][0]['district']))] = {
+                'rep_id': rep['_id'],
+                'name': f"{rep['first_name']} {rep['last_name']}",
+                'party': rep['current_party'],
+            }
+
+    return reps
+
+def join_reps(states, districts, reps):
+    '''
+    Function to join located (state, cd116 code) pairs to reps, returning one dict (or None) per point
+    '''
+
+    lookup = {}
+    joined = []
+    for state, code in zip(states, districts):
+        if state is None:
+            joined.append(None)
+            continue
+        if (state, code) not in lookup:
+            rep = reps.get((state, role_district(code)))
+            lookup[(state, code)] = dict(rep or {}, state=state, district=code)
+        joined.append(lookup[(state, code)])
+
+    return joined
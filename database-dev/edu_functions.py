@@ -0,0 +1,241 @@
+import re
+import unicodedata
+
+########################
+# Degree Normalization #
+########################
+
+# Bin degrees
+DEGREE_DICT = {
+    'Bachelors': [
+        'BS', 'BA', 'AB', 'BPA', 'BBA', 'ALB', 'LLB', 'BDIV',
+        'BSFS', 'BPA', 'BSN', 'BGS'
+    ],
+    'Masters': [
+        'MPA', 'MA', 'MSW', 'MS', 'MPP', 'MDIV', 'THM', 'MUP',
+        'MHS', 'SYC', 'GRCERT', 'MPHIL', 'MIA', 'MSS', 'MPH',
+        'MACC', 'MFA', 'MED', 'MPH', 'MSEM', 'MSC'
+    ],
+    'Doctorate': ['PHD', 'DPA', 'EDD', 'PHARMD', 'DMIN', 'DPHIL'],
+    'MBA': ['MBA'],
+    'Med': ['MD', 'DPM'],
+    'Vet': ['DVM'],
+    'Nur': ['GRDIP', 'MSN'],
+    'Den': ['DDS', 'DMD'],
+    'Law': ['JD', 'LLM'],
+    'HS': ['HS'],
+    'Associates': ['AA', 'AAS', 'AS']
+}
+DEGREE_DICT['Health'] = DEGREE_DICT['Med'] + DEGREE_DICT['Vet'] + DEGREE_DICT['Nur'] + DEGREE_DICT['Den']
+
+# Category field names stored on reps (e.g. 'bachelors', 'health')
+DEGREE_CATEGORIES = [ k.lower() for k in DEGREE_DICT.keys() ]
+
+# Alternate spellings of the same degree
+DEGREE_ALIASES = {
+    'AB': 'BA',
+    'ALB': 'BA',
+    'MSC': 'MS',
+    'DPHIL': 'PHD',
+}
+
+# Compiled lookup: cleaned degree string -> (canonical degree, categories)
+DEGREE_LOOKUP = {}
+for category, codes in DEGREE_DICT.items():
+    for code in codes:
+        canonical, categories = DEGREE_LOOKUP.get(code, (DEGREE_ALIASES.get(code, code), []))
+        if category.lower() not in categories:
+            categories.append(category.lower())
+        DEGREE_LOOKUP[code] = (canonical, categories)
+
+# Default education for reps without degrees
+DEFAULT_EDUCATION = [['HS', 'High School']]
+
+def clean_degree(degree):
+    '''
+    Function to strip dots and uppercase a raw degree string (as data_acq_functions.clean_edu does)
+    '''
+
+    return ''.join(degree.split('.')).upper().strip()
+
+def normalize_degree(degree):
+    '''
+    Function to map a raw degree string to its canonical degree and categories
+    '''
+
+    degree = clean_degree(degree)
+    canonical, categories = DEGREE_LOOKUP.get(degree, (degree, []))
+
+    return canonical, categories
+
+def degree_fields(education):
+    '''
+    Function to derive the stored degree fields of a rep from [degree, institution] pairs
+    (None/[] -> [['HS', 'High School']])
+    '''
+
+    if not education:
+        education = DEFAULT_EDUCATION
+
+    codes = []
+    categories = []
+    for entry in education:
+        canonical, degree_categories = normalize_degree(entry[0])
+        codes.append(canonical)
+        categories.extend(degree_categories)
+
+    fields = {
+        'education': education,
+        'degree_codes': sorted(set(codes)),
+        'degree_categories': sorted(set(categories)),
+    }
+
+    return fields
+
+
+#############################
+# Institution Normalization #
+#############################
+
+# Abbreviations expanded before matching
+INSTITUTION_ABBREVIATIONS = {
+    'univ': 'university',
+    'coll': 'college',
+    'inst': 'institute',
+    'tech': 'technology',
+    'mt': 'mount',
+    'ft': 'fort',
+    'sch': 'school',
+}
+
+# Minimum trigram similarity (Jaccard) of a fuzzy match, and of each differing word
+FUZZY_THRESHOLD = 0.6
+WORD_THRESHOLD = 0.4
+
+def institution_key(name):
+    '''
+    Function to normalize a raw institution string into its alias key
+    (accents, case, punctuation, leading "The" and abbreviations folded)
+    '''
+
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join( c for c in name if not unicodedata.combining(c) ).lower()
+    name = name.replace('&', ' and ')
+    words = re.sub(r"[^a-z0-9 ]+", ' ', name.replace("'", '')).split()
+    if words and words[0] == 'the':
+        words = words[1:]
+
+    return ' '.join( INSTITUTION_ABBREVIATIONS.get(word, word) for word in words )
+
+def institution_id(key):
+    return key.replace(' ', '-')
+
+def trigrams(text):
+    '''
+    Function to return the set of padded word trigrams of a string (as PostgreSQL pg_trgm)
+    '''
+
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update( padded[i:i + 3] for i in range(len(padded) - 2) )
+
+    return grams
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+
+    return shared / (len(a) + len(b) - shared)
+
+def same_words(a, b):
+    '''
+    Helper function to guard fuzzy matches: same word count and every differing word
+    similar (a typo matches, "University of Texas at Austin" does not match "University of Texas")
+    '''
+
+    a, b = a.split(), b.split()
+    if len(a) != len(b):
+        return False
+
+    return all( x == y or similarity(trigrams(x), trigrams(y)) >= WORD_THRESHOLD for x, y in zip(a, b) )
+
+
+class InstitutionIndex():
+    '''
+    Alias table of canonical institutions ({_id, name, aliases} documents) with an
+    inverted trigram index over every alias for fuzzy matching
+    '''
+
+    def __init__(self, docs=()):
+        self.names = {}
+        self.aliases = {}
+        self.postings = {}
+        self.grams = {}
+        self.changed = set()
+        for doc in docs:
+            self.names[doc['_id']] = doc['name']
+            for key in doc.get('aliases', []):
+                self.add_alias(key, doc['_id'])
+
+    def add_alias(self, key, _id):
+        self.aliases[key] = _id
+        self.grams[key] = trigrams(key)
+        for gram in self.grams[key]:
+            self.postings.setdefault(gram, []).append(key)
+
+    def search(self, key, threshold=FUZZY_THRESHOLD):
+        '''
+        Function to return (alias, score) of the most similar known alias, or (None, 0.0)
+        (candidates counted from the posting lists of the key's trigrams)
+        '''
+
+        grams = trigrams(key)
+        shared = {}
+        for gram in grams:
+            for alias in self.postings.get(gram, []):
+                shared[alias] = shared.get(alias, 0) + 1
+
+        best, best_score = None, 0.0
+        for alias, count in shared.items():
+            score = count / (len(grams) + len(self.grams[alias]) - count)
+            if score >= threshold and score > best_score and same_words(key, alias):
+                best, best_score = alias, score
+
+        return best, best_score
+
+    def canonicalize(self, name):
+        '''
+        Function to map a raw institution string to its canonical ID, learning new aliases
+        (exact alias, else fuzzy match, else a new institution)
+        '''
+
+        key = institution_key(name)
+        if not key:
+            return None
+        if key in self.aliases:
+            return self.aliases[key]
+
+        alias, _ = self.search(key)
+        if alias is not None:
+            _id = self.aliases[alias]
+        else:
+            _id = institution_id(key)
+            self.names.setdefault(_id, name.strip())
+        self.add_alias(key, _id)
+        self.changed.add(_id)
+
+        return _id
+
+    def docs(self, changed_only=True):
+        '''
+        Function to return alias table documents (only institutions with new aliases by default)
+        '''
+
+        by_id = {}
+        for key, _id in self.aliases.items():
+            by_id.setdefault(_id, []).append(key)
+        ids = self.changed if changed_only else by_id.keys()
+
+        return [ {'_id': _id, 'name': self.names[_id], 'aliases': sorted(by_id[_id])} for _id in sorted(ids) ]
@@ -0,0 +1,63 @@
+from data_acq_functions import (
+    Auth, clean_edu, get_vs_id, get_wiki_edus, map_concurrent, vs_edu_scrape
+)
+from edu_functions import degree_fields
+from etl_functions import canonicalize_institutions
+from load_functions import ChunkedWriter
+
+# Maximum concurrent Vote Smart requests
+MAX_WORKERS = 4
+
+def main():
+    # Config transport and database
+    config = Auth('./auth/config.ini')
+    transport = config.config_transport(config.config_cache())
+    m_db = config.config_mongodb()
+    m_coll = m_db['reps']
+
+    # Retrieve all representative IDs, Wikipedia URLs, VoteSmart IDs, first name, last name
+    projection = {'_id': 1, 'first_name': 1, 'last_name': 1, 'wiki_url': 1, 'votesmart_id': 1}
+    reps = { rep['_id']: rep for rep in m_coll.find({}, projection) }
+
+    # Wikipedia infobox education in batched MediaWiki queries
+    wiki_urls = [ rep['wiki_url'] for rep in reps.values() if rep.get('wiki_url') ]
+    wiki_edus, wiki_errors = get_wiki_edus(wiki_urls, transport)
+    print(f'Wikipedia pages: {len(wiki_urls)}, no infobox education: {len(wiki_errors)}')
+
+    def education(member_id):
+        rep = reps[member_id]
+
+        # Degrees paired with institutions from Wikipedia
+        edus = wiki_edus.get(rep.get('wiki_url'))
+        if edus is not None and len(edus) >= 2:
+            rep['education'] = edus
+            edus, error = clean_edu(rep)
+            if not error and edus:
+                return edus
+
+        # No degree shown on Wikipedia, fall back to Vote Smart
+        if not rep.get('votesmart_id'):
+            vs_id, error = get_vs_id(rep, transport)
+            if error:
+                return None
+            rep['votesmart_id'] = vs_id
+        edus, error = vs_edu_scrape(rep, transport)
+
+        return None if error else edus
+
+    results, errors = map_concurrent(education, list(reps), MAX_WORKERS)
+    for member_id, error in errors.items():
+        print(f'Error retrieving education for {member_id}: {error!r}')
+
+    # Store education with ingest-time degree normalization
+    with ChunkedWriter(m_coll, 100) as writer:
+        for member_id, edus in results.items():
+            rep = reps[member_id]
+            writer.add(dict({'_id': member_id, 'votesmart_id': rep.get('votesmart_id')}, **degree_fields(edus)))
+    print(writer.totals)
+
+    # Canonical institution IDs for the new education
+    canonicalize_institutions(m_coll, m_db['institutions'])
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,18 @@
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import firestore
-
 from data_acq_functions import Auth
-from etl_functions import edu_by_state
+import states_to_firestore
+
+def load(m_db, f_db):
+    # Education summary from the single-pass state summaries
+    return states_to_firestore.load(m_db, f_db, ['edu'])
 
 def main():
     # Config databases
     config = Auth('./auth/config.ini')
     m_db = config.config_mongodb()
-    m_coll = m_db['reps']
-    FIREBASE_CERT = config.get_configs('firebase')[0]
-    cred = credentials.Certificate(FIREBASE_CERT)
-    firebase_admin.initialize_app(cred)
-    f_db = firestore.client()
-    f_coll = f_db.collection('state_edu')
-
-    # Extract from MongoDB
-    states = edu_by_state(m_coll)
-    
-    # Load to Firestore
-    batch = f_db.batch()
-    for state in states:
-        ref = f_coll.document(state['_id'])
-        batch.set(ref, state)
+    f_db = config.config_firestore()
 
-    results = batch.commit()
-    print('Docs loaded:', len(results))
+    load(m_db, f_db)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,35 +1,141 @@
-import pymongo
 import us
 
-def clean_edu(collection):
+from edu_functions import DEFAULT_EDUCATION, DEGREE_CATEGORIES, InstitutionIndex, degree_fields
+
+# Define states to match (i.e. exclude Virgin Islands)
+STATE_ABBRS = [ state.abbr for state in us.states.STATES ] + ['DC']
+
+# In-office House members (senators loaded by a backfill are excluded; older docs have no chamber)
+HOUSE_MATCH = {'in_office': True, 'roles.0.chamber': {'$ne': 'Senate'}}
+
+# Indexable match shared by state summaries (no $expr)
+STATE_MATCH = dict(HOUSE_MATCH, state={'$in': STATE_ABBRS})
+
+# Degree categories counted in the state education summaries (dashboard options)
+EDU_SUMMARY_CATEGORIES = ['bachelors', 'masters', 'doctorate', 'health', 'mba', 'law', 'associates', 'hs']
+
+def ensure_indexes(collection):
+    '''
+    Function to create the indexes used by state summaries and exports
+    '''
+
+    import pymongo
+
+    names = [
+        collection.create_index([('in_office', pymongo.ASCENDING), ('state', pymongo.ASCENDING)]),
+        collection.create_index('state'),
+        collection.create_index('current_party'),
+        collection.create_index('degree_categories'),
+        collection.create_index('degree_codes'),
+        collection.create_index('institution_ids'),
+    ]
+
+    return names
+
+def clean_edu(collection, match=None):
     '''
     Function to maintain consistent educational background data types
-    (i.e. None-> [['HS', 'High School']])
+    (i.e. None-> [['HS', 'High School']], match: optional extra filter, e.g. {'_id': {'$in': ids}})
     '''
 
-    results_1 = collection.update_many(
-        {'education': None},
-        {'$set': {'education': [['HS', 'High School']]}}
-    )
-    results_2 = collection.update_many(
-        {'education': []},
-        {'$set': {'education': [['HS', 'High School']]}}
+    results = collection.update_many(
+        dict({'education': {'$in': [None, []]}}, **(match or {})),
+        {'$set': degree_fields(DEFAULT_EDUCATION)}
     )
-    total = results_1.modified_count + results_2.modified_count
+    print(f'Documents updated: {results.modified_count}')
+
+def backfill_degrees(collection, chunk_size=500):
+    '''
+    Function to store canonical degree fields (degree_codes, degree_categories) on existing reps
+    '''
+
+    import pymongo
+
+    ops = []
+    total = 0
+    for rep in collection.find({}, {'education': 1}):
+        ops.append(pymongo.UpdateOne({'_id': rep['_id']}, {'$set': degree_fields(rep.get('education'))}))
+        if len(ops) == chunk_size:
+            total += collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        total += collection.bulk_write(ops, ordered=False).modified_count
     print(f'Documents updated: {total}')
 
-def et_mongo2firestore(collection, page_num, max_results):
+    return total
+
+def canonicalize_institutions(collection, institutions, chunk_size=500):
     '''
-    Extract, transform stage of MongoDB to Firestore
+    Function to map every rep's education institutions to canonical IDs in one pass
+    (institution_ids, parallel to education), persisting new aliases to the
+    institutions collection ({_id, name, aliases}; edit aliases there to correct matches)
+    '''
+
+    import pymongo
+
+    index = InstitutionIndex(institutions.find({}))
+
+    ops = []
+    total = 0
+    for rep in collection.find({}, {'education': 1, 'institution_ids': 1}):
+        ids = [ index.canonicalize(edu[1]) if len(edu) > 1 and edu[1] else None for edu in rep.get('education') or [] ]
+        if ids != rep.get('institution_ids'):
+            ops.append(pymongo.UpdateOne({'_id': rep['_id']}, {'$set': {'institution_ids': ids}}))
+        if len(ops) == chunk_size:
+            total += collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        total += collection.bulk_write(ops, ordered=False).modified_count
+
+    # Manually edited names are kept, only new aliases are added
+    docs = index.docs()
+    if docs:
+        institutions.bulk_write([
+            pymongo.UpdateOne(
+                {'_id': doc['_id']},
+                {'$setOnInsert': {'name': doc['name']}, '$addToSet': {'aliases': {'$each': doc['aliases']}}},
+                upsert=True
+            )
+            for doc in docs
+        ], ordered=False)
+    print(f'Documents updated: {total}, institutions with new aliases: {len(docs)}')
+
+    return total
+
+def institution_counts(collection, match=None):
+    '''
+    Function to count in-office reps per canonical institution (each rep counted once)
+    '''
+
+    pipeline = [
+        {'$match': dict(HOUSE_MATCH, institution_ids={'$ne': None}, **(match or {}))},
+        {'$unwind': '$institution_ids'},
+        {'$match': {'institution_ids': {'$ne': None}}},
+        {'$group': {'_id': '$institution_ids', 'reps': {'$addToSet': '$_id'}}},
+        {'$project': {'count': {'$size': '$reps'}}},
+        {'$sort': {'count': -1, '_id': 1}},
+    ]
+
+    return list(collection.aggregate(pipeline))
+
+def mongo2firestore_pipeline(match=None):
+    '''
+    Aggregation stages reshaping in-office reps for Firestore
+    (match: optional extra filter, e.g. {'_id': {'$in': ids}})
     '''
 
     match_stage = {
-        '$match': {'in_office': True}
+        '$match': dict(HOUSE_MATCH, **(match or {}))
     }
     fields_stage = {
         '$addFields': {
             'name': {'$concat': ['$first_name',' ', '$last_name']},
             'district': {'$arrayElemAt': ['$roles.district', 0]},
+            # Default education as in clean_edu, so $unwind keeps reps without degrees
+            'education': {'$cond': [
+                {'$gt': [{'$size': {'$ifNull': ['$education', []]}}, 0]},
+                '$education', {'$literal': DEFAULT_EDUCATION}
+            ]},
         }
     }
     unwind_stage = {
@@ -52,83 +158,60 @@ def et_mongo2firestore(collection, page_num, max_results):
     sort_stage = {
         '$sort': {'_id': 1}
     }
+    pipeline = [
+        match_stage, fields_stage, unwind_stage, group_stage, sort_stage
+    ]
+
+    return pipeline
+
+def et_mongo2firestore(collection, page_num, max_results):
+    '''
+    Extract, transform stage of MongoDB to Firestore
+    '''
+
     skip_stage = {
         '$skip': page_num * max_results
     }
     limit_stage = {
         '$limit': max_results
     }
-    pipeline = [
-        match_stage, fields_stage, unwind_stage, group_stage,
-        sort_stage, skip_stage, limit_stage
-    ]
+    pipeline = mongo2firestore_pipeline() + [skip_stage, limit_stage]
     results = collection.aggregate(pipeline)
     reps = [ rep for rep in results ]
 
     return reps
 
-def edu_by_state(collection):
+def stream_mongo2firestore(collection, batch_size=500, match=None):
     '''
-    Function to get proportions of reps with educational degrees
+    Extract, transform stage of MongoDB to Firestore as a single streaming cursor
+    (the pipeline runs once, no $skip pagination)
     '''
 
-    # Bin degrees
-    degree_dict = {
-        'Bachelors': [
-            'BS', 'BA', 'AB', 'BPA', 'BBA', 'ALB', 'LLB', 'BDIV',
-            'BSFS', 'BPA', 'BSN', 'BGS'
-        ],
-        'Masters': [
-            'MPA', 'MA', 'MSW', 'MS', 'MPP', 'MDIV', 'THM', 'MUP',
-            'MHS', 'SYC', 'GRCERT', 'MPHIL', 'MIA', 'MSS', 'MPH',
-            'MACC', 'MFA', 'MED', 'MPH', 'MSEM', 'MSC'
-        ],
-        'Doctorate': ['PHD', 'DPA', 'EDD', 'PHARMD', 'DMIN', 'DPHIL'],
-        'MBA': ['MBA'],
-        'Med': ['MD', 'DPM'],
-        'Vet': ['DVM'],
-        'Nur': ['GRDIP', 'MSN'],
-        'Den': ['DDS', 'DMD'],
-        'Law': ['JD', 'LLM'],
-        'HS': ['HS'],
-        'Associates': ['AA', 'AAS', 'AS']
-    }
-    degree_dict['Health'] = degree_dict['Med'] + degree_dict['Vet'] + degree_dict['Nur'] + degree_dict['Den']
-    
-    # Define states to match (i.e. exclude Virgin Islands)
-    state_abbrs = [ state.abbr for state in us.states.STATES ] + ['DC']
+    pipeline = mongo2firestore_pipeline(match)
+    cursor = collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
 
-    pipeline = [
-        {
-            '$match': {'$expr': {'$in': ['$state', state_abbrs]}}
-        },
-        {
-            '$unwind': '$education'
-        },
-        {
-            '$group': {
-                '_id': '$_id',
-                'state': {'$first': '$state'},
-                'degrees': {'$push': {'$arrayElemAt': ['$education', 0]}},
-            }
-        },
+    return cursor
+
+def edu_stages():
+    '''
+    Aggregation stages for proportions of reps with educational degrees by state
+    '''
+
+    # Category flags from ingest-time degree_categories (see edu_functions.degree_fields)
+    stages = [
         {
-            '$addFields': {
-                k.lower(): {'$toInt': {'$or' :[ {'$in': [v, '$degrees']} for v in degree_dict[k] ]}}
-                for k in degree_dict.keys()
+            '$project': {
+                'state': 1,
+                **{
+                    k: {'$toInt': {'$in': [k, {'$ifNull': ['$degree_categories', []]}]}}
+                    for k in DEGREE_CATEGORIES
+                }
             }
         },
         {
             '$group': {
                 '_id': '$state',
-                'bachelors': {'$sum': '$bachelors'},
-                'masters': {'$sum': '$masters'},
-                'doctorate': {'$sum': '$doctorate'},
-                'health': {'$sum': '$health'},
-                'mba': {'$sum': '$mba'},
-                'law': {'$sum': '$law'},
-                'associates': {'$sum': '$associates'},
-                'hs': {'$sum': '$hs'},
+                **{ k: {'$sum': f'${k}'} for k in EDU_SUMMARY_CATEGORIES },
                 'count': {'$sum': 1},
             }
         },
@@ -137,78 +220,153 @@ def edu_by_state(collection):
         },
         {
             '$project': {
-                'bachelors': {'$round': ['$bachelors', 4]},
-                'masters': {'$round': ['$masters', 4]},
-                'doctorate': {'$round': ['$doctorate', 4]},
-                'health': {'$round': ['$health', 4]},
-                'mba': {'$round': ['$mba', 4]},
-                'law': {'$round': ['$law', 4]},
-                'associates': {'$round': ['$associates', 4]},
-                'hs': {'$round': ['$hs', 4]},
+                **{ k: {'$round': [f'${k}', 4]} for k in EDU_SUMMARY_CATEGORIES },
                 'count': 1,
             }
         }
     ]
-    results = collection.aggregate(pipeline)
-    states = [ state for state in results ]
 
-    return states
+    return stages
 
-def party_by_state(collection):
-    state_abbrs = [ state.abbr for state in us.states.STATES ] + ['DC']
+def party_stages():
+    '''
+    Aggregation stages for party counts by state
+    '''
 
-    pipeline = [
-        {
-            '$match': {'$expr': {'$in': ['$state', state_abbrs]}}
-        },
-        {
-        '$project': {
-            '_id': 0,
-            'state': 1,
-            'R': {'$toInt': {'$eq': ['$current_party', 'R']}},
-            'D': {'$toInt': {'$eq': ['$current_party', 'D']}},
-            'I': {'$toInt': {'$eq': ['$current_party', 'I']}},
-        }  
-        },
+    stages = [
         {
             '$group': {
                 '_id': '$state',
-                'R': {'$sum': '$R'},
-                'D': {'$sum': '$D'},
-                'I': {'$sum': '$I'},
+                'R': {'$sum': {'$toInt': {'$eq': ['$current_party', 'R']}}},
+                'D': {'$sum': {'$toInt': {'$eq': ['$current_party', 'D']}}},
+                'I': {'$sum': {'$toInt': {'$eq': ['$current_party', 'I']}}},
             }
         }
     ]
 
-    results = collection.aggregate(pipeline)
-    states = [ state for state in results ]
+    return stages
 
-    return states
+def gender_stages():
+    '''
+    Aggregation stages for gender counts by state
+    '''
 
-def gender_by_state(collection):
-    state_abbrs = [ state.abbr for state in us.states.STATES ] + ['DC']
+    stages = [
+        {
+            '$group': {
+                '_id': '$state',
+                'M': {'$sum': {'$toInt': {'$eq': ['$gender', 'M']}}},
+                'F': {'$sum': {'$toInt': {'$eq': ['$gender', 'F']}}},
+            }
+        }
+    ]
+
+    return stages
+
+def state_summaries(collection, states=None):
+    '''
+    Function to get education, party and gender breakdowns by state in a single pass
+    (one indexed $match feeding a $facet, returns {'edu': [...], 'party': [...], 'gender': [...]};
+    states: optional subset of state abbreviations)
+    '''
 
+    match = STATE_MATCH
+    if states is not None:
+        match = dict(STATE_MATCH, state={'$in': [ state for state in STATE_ABBRS if state in states ]})
     pipeline = [
         {
-            '$match': {'$expr': {'$in': ['$state', state_abbrs]}}
+            '$match': match
         },
         {
-            '$project': {
-                '_id': 0,
-                'state': 1,
-                'M': {'$toInt': {'$eq': ['$gender', 'M']}},
-                'F': {'$toInt': {'$eq': ['$gender', 'F']}},
+            '$facet': {
+                'edu': edu_stages(),
+                'party': party_stages(),
+                'gender': gender_stages(),
             }
+        }
+    ]
+    summaries = next(collection.aggregate(pipeline))
+
+    return summaries
+
+def contribution_stages(group_field):
+    '''
+    Aggregation stages for sector contribution totals grouped by a field (e.g. state or party),
+    sectors sorted by total
+    '''
+
+    stages = [
+        {
+            '$unwind': '$sectors'
         },
         {
             '$group': {
-                '_id': '$state',
-                'M': {'$sum': '$M'},
-                'F': {'$sum': '$F'},
+                '_id': {'group': f'${group_field}', 'sector': '$sectors.sector'},
+                'individual': {'$sum': '$sectors.individual'},
+                'pacs': {'$sum': '$sectors.pacs'},
+                'total': {'$sum': '$sectors.total'},
+            }
+        },
+        {
+            '$sort': {'total': -1}
+        },
+        {
+            '$group': {
+                '_id': '$_id.group',
+                'sectors': {
+                    '$push': {
+                        'sector': '$_id.sector',
+                        'individual': '$individual',
+                        'pacs': '$pacs',
+                        'total': '$total',
+                    }
+                },
+                'total': {'$sum': '$total'},
             }
+        }
+    ]
+
+    return stages
+
+def contribution_summaries(collection):
+    '''
+    Function to get sector contribution totals by state and by party in a single pass
+    over the contributions collection (returns {'state': [...], 'party': [...]})
+    '''
+
+    pipeline = [
+        {
+            '$match': {'in_office': True}
         },
+        {
+            '$facet': {
+                'state': [{'$match': {'state': {'$in': STATE_ABBRS}}}] + contribution_stages('state'),
+                'party': contribution_stages('party'),
+            }
+        }
     ]
+    summaries = next(collection.aggregate(pipeline))
 
+    return summaries
+
+def edu_by_state(collection):
+    '''
+    Function to get proportions of reps with educational degrees
+    '''
+
+    pipeline = [{'$match': STATE_MATCH}] + edu_stages()
     states = [ state for state in collection.aggregate(pipeline) ]
 
-    return states
\ No newline at end of file
+    return states
+
+def party_by_state(collection):
+    pipeline = [{'$match': STATE_MATCH}] + party_stages()
+    states = [ state for state in collection.aggregate(pipeline) ]
+
+    return states
+
+def gender_by_state(collection):
+    pipeline = [{'$match': STATE_MATCH}] + gender_stages()
+    states = [ state for state in collection.aggregate(pipeline) ]
+
+    return states
@@ -0,0 +1,86 @@
+import hashlib
+
+import geopandas as gpd
+import pandas as pd
+import topojson as tp
+import us
+
+# Census cartographic boundary shapefiles (https://www.census.gov/geographies/mapping-files/time-series/geo/cartographic-boundary.html)
+CD_SHAPEFILE = '../cb_2019_us_cd116_5m/cb_2019_us_cd116_5m.shp'
+STATE_SHAPEFILE = '../cb_2019_us_state_5m/cb_2019_us_state_5m.shp'
+
+# Only 50 states + DC
+STATE_ABBRS = [ state.abbr for state in us.states.STATES ] + ['DC']
+
+# State FIPS code to abbreviation (national map ids)
+FIPS_ABBRS = dict({ state.fips: state.abbr for state in us.states.STATES }, **{us.states.DC.fips: 'DC'})
+
+def load_districts(cd_shapefile=CD_SHAPEFILE, state_shapefile=STATE_SHAPEFILE):
+    '''
+    Function to read congressional districts joined to their states, with projection
+    parallels and centers (columns: state, state_abbr, cd116, state_parallels, state_center, geometry)
+    '''
+
+    cd = gpd.read_file(cd_shapefile)
+    st = gpd.read_file(state_shapefile)
+
+    # Merge GeoDataFrames on state FIPS code
+    df = pd.merge(cd, st, on='STATEFP', how='left', suffixes=('_cd', '_state'))
+    df = df.loc[df['STUSPS'].isin(STATE_ABBRS)]
+
+    # Parallels and geographic centers for Albers projections
+    df['state_parallels'] = df['geometry_state'].bounds[['miny', 'maxy']].values.tolist()
+    df['state_parallels'] = df['state_parallels'].map(lambda x: str(x))
+    df['state_center'] = gpd.GeoSeries(df['geometry_state']).centroid.map(lambda x: x.bounds[:2])
+    df['state_center'] = df['state_center'].map(lambda x: str(list(x)))
+
+    col_dict = {
+        'CD116FP': 'cd116',
+        'STUSPS': 'state_abbr',
+        'NAME': 'state',
+        'geometry_cd': 'geometry'
+    }
+    df = df.rename(columns=col_dict)
+    df = df[['state', 'state_abbr', 'cd116', 'state_parallels', 'state_center', 'geometry']]
+
+    return gpd.GeoDataFrame(df, geometry='geometry', crs=cd.crs)
+
+def load_national(usa_source):
+    '''
+    Function to read the composite Albers national map (https://github.com/topojson/us-atlas)
+    with state abbreviations as ids
+    '''
+
+    usa = gpd.read_file(usa_source)
+    usa['id'] = usa['id'].map(FIPS_ABBRS)
+
+    return usa
+
+def source_hash(gdf, params):
+    '''
+    Function to hash a GeoDataFrame's geometries and attributes with the build parameters
+    '''
+
+    digest = hashlib.sha256(repr(sorted(params.items())).encode())
+    digest.update(gdf.drop(columns='geometry').to_csv(index=False).encode())
+    for wkb in gdf.geometry.to_wkb():
+        digest.update(wkb)
+
+    return digest.hexdigest()
+
+def build_topology(gdf, quantization=1e5, simplify=0.0):
+    '''
+    Function to build a TopoJSON topology (object 'data') with quantized coordinates and
+    topology-preserving simplification of shared arcs (simplify: Douglas-Peucker tolerance
+    in source units, 0 to keep every vertex)
+    '''
+
+    topo = tp.Topology(
+        data=gdf,
+        prequantize=quantization or False,
+        topoquantize=quantization or False,
+        toposimplify=simplify or False,
+        object_name='data'
+    )
+
+    return topo
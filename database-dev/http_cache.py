@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlencode, urlsplit
+
+# Time-to-live (seconds) per source host
+DEFAULT_TTLS = {
+    'api.propublica.org': 24 * 3600,
+    'en.wikipedia.org': 7 * 24 * 3600,
+    'votesmart.org': 30 * 24 * 3600,
+    'justfacts.votesmart.org': 30 * 24 * 3600,
+    'www.opensecrets.org': 24 * 3600,
+}
+DEFAULT_TTL = 24 * 3600
+
+# Request parameters left out of cache keys
+SECRET_PARAMS = {'apikey', 'key'}
+
+
+class CachedResponse():
+    '''
+    Minimal stand-in for requests.Response served from the cache
+    '''
+
+    def __init__(self, url, status_code, headers, content, from_cache=True):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            from requests import HTTPError
+            raise HTTPError(f'{self.status_code} for {self.url}')
+
+
+class ResponseCache():
+    '''
+    Persistent, compressed HTTP response cache keyed by URL and params
+    (SQLite index with zlib bodies, per-host TTLs, LRU eviction by total size)
+    '''
+
+    def __init__(self, cache_dir='./cache', ttls=None, default_ttl=DEFAULT_TTL, max_bytes=512 * 2**20):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'responses.sqlite')
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            '''CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT,
+                body BLOB, size INTEGER, etag TEXT, last_modified TEXT,
+                fetched_at REAL, accessed_at REAL
+            )'''
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS accessed ON responses (accessed_at)')
+        self.conn.commit()
+
+    @staticmethod
+    def key(url, params=None, variant=None):
+        params = sorted( (k, v) for k, v in (params or {}).items() if k not in SECRET_PARAMS )
+        raw = url + '?' + urlencode(params)
+        if variant:
+            raw += '#' + variant
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def ttl(self, url):
+        return self.ttls.get(urlsplit(url).hostname, self.default_ttl)
+
+    def get(self, url, params=None, headers=None, fetch=None, variant=None, **kwargs):
+        '''
+        Function to return a fresh cached response, revalidating or fetching when stale
+        (variant distinguishes partial bodies of the same URL, fetch defaults to requests.get)
+        '''
+
+        if fetch is None:
+            import requests
+            fetch = requests.get
+
+        key = self.key(url, params, variant)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT status, headers, body, etag, last_modified, fetched_at FROM responses WHERE key = ?',
+                (key,)
+            ).fetchone()
+
+        if row is not None:
+            status, cached_headers, body, etag, last_modified, fetched_at = row
+            cached = CachedResponse(url, status, json.loads(cached_headers), zlib.decompress(body))
+            if now - fetched_at < self.ttl(url):
+                self._touch(key, now)
+                return cached
+
+            # Conditional request for stale entries
+            headers = dict(headers or {})
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+            r = fetch(url, params=params, headers=headers, **kwargs)
+            if r.status_code == 304:
+                with self.lock:
+                    self.conn.execute(
+                        'UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?',
+                        (now, now, key)
+                    )
+                    self.conn.commit()
+                return cached
+        else:
+            r = fetch(url, params=params, headers=headers, **kwargs)
+
+        if r.status_code == 200:
+            self._store(key, url, r, now)
+
+        return r
+
+    def _touch(self, key, now):
+        with self.lock:
+            self.conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+            self.conn.commit()
+
+    def _store(self, key, url, r, now):
+        body = zlib.compress(r.content)
+        headers = { k: v for k, v in r.headers.items() if k.lower() in ('content-type', 'etag', 'last-modified') }
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    key, url, r.status_code, json.dumps(headers), body, len(body),
+                    r.headers.get('ETag'), r.headers.get('Last-Modified'), now, now
+                )
+            )
+            self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        '''
+        Function to drop least recently used entries until the cache fits in max_bytes
+        '''
+
+        with self.lock:
+            total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            evicted = 0
+            rows = self.conn.execute('SELECT key, size FROM responses ORDER BY accessed_at')
+            for key, size in rows.fetchall():
+                if total <= self.max_bytes:
+                    break
+                self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                total -= size
+                evicted += 1
+            self.conn.commit()
+
+        return evicted
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM responses')
+            self.conn.commit()
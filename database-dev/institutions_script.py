@@ -0,0 +1,19 @@
+from data_acq_functions import Auth
+from etl_functions import canonicalize_institutions, ensure_indexes, institution_counts
+
+def main():
+    # Config database
+    config = Auth('./auth/config.ini')
+    m_db = config.config_mongodb()
+    m_coll = m_db['reps']
+
+    # Canonical institution IDs for every rep, new aliases saved to the alias table
+    canonicalize_institutions(m_coll, m_db['institutions'])
+    print('Indexes:', ensure_indexes(m_coll))
+
+    names = { doc['_id']: doc['name'] for doc in m_db['institutions'].find({}, {'name': 1}) }
+    for row in institution_counts(m_coll)[:20]:
+        print(f"{row['count']:4d} {names.get(row['_id'], row['_id'])}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+###################
+# MongoDB Loading #
+###################
+
+class Checkpoint():
+    '''
+    Append-only journal of completed member IDs so interrupted runs can resume
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = { line.strip() for line in f if line.strip() }
+
+    def __contains__(self, member_id):
+        return member_id in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def record(self, member_ids):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as f:
+            for member_id in member_ids:
+                f.write(f'{member_id}\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(member_ids)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.done = set()
+
+
+class ChunkedWriter():
+    '''
+    Streaming writer flushing unordered bulk upserts to MongoDB in fixed-size chunks,
+    recording written IDs in an optional Checkpoint
+    '''
+
+    def __init__(self, collection, chunk_size=50, checkpoint=None):
+        self.collection = collection
+        self.chunk_size = chunk_size
+        self.checkpoint = checkpoint
+        self.ops = []
+        self.ids = []
+        self.chunks = 0
+        self.totals = {'upserted': 0, 'modified': 0, 'errors': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def add(self, doc):
+        '''
+        Function to queue an upsert ($set, keeps fields not in doc) and flush full chunks
+        '''
+
+        from pymongo import UpdateOne
+
+        fields = { k: v for k, v in doc.items() if k != '_id' }
+        self.ops.append(UpdateOne({'_id': doc['_id']}, {'$set': fields}, upsert=True))
+        self.ids.append(doc['_id'])
+        if len(self.ops) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.ops:
+            return None
+
+        from pymongo.errors import BulkWriteError
+
+        try:
+            result = self.collection.bulk_write(self.ops, ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            result = e.details
+        failed = { error['index'] for error in result.get('writeErrors', []) }
+        written = [ _id for i, _id in enumerate(self.ids) if i not in failed ]
+        if self.checkpoint is not None:
+            self.checkpoint.record(written)
+
+        self.chunks += 1
+        self.totals['upserted'] += result.get('nUpserted', 0)
+        self.totals['modified'] += result.get('nModified', 0)
+        self.totals['errors'] += len(failed)
+        print(
+            f"Chunk {self.chunks}: upserted {result.get('nUpserted', 0)}, "
+            f"modified {result.get('nModified', 0)}, errors {len(failed)}"
+        )
+        for error in result.get('writeErrors', []):
+            print(f"  {self.ids[error['index']]}: {error.get('errmsg')}")
+
+        self.ops = []
+        self.ids = []
+
+        return result
+
+
+#####################
+# Firestore Loading #
+#####################
+
+# Maximum writes per Firestore batch
+FIRESTORE_BATCH_SIZE = 500
+
+def document_fingerprint(doc):
+    '''
+    Function to fingerprint a Firestore document for change detection
+    '''
+
+    raw = json.dumps(doc, sort_keys=True, default=str)
+
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def load_firestore(f_db, collection_name, docs, batch_size=FIRESTORE_BATCH_SIZE, max_in_flight=4,
+                   fingerprints=None, prune=False, ids=None):
+    '''
+    Function to stream documents (keyed by _id) into Firestore batches, committing up to
+    max_in_flight batches concurrently and pausing the source cursor while they are full
+    (fingerprints: optional MongoDB sidecar collection, only new or changed documents are written
+    and prune deletes target documents missing from the source; ids: document IDs of an
+    incremental sync, those missing from docs are deleted)
+    '''
+
+    f_coll = f_db.collection(collection_name)
+    total = 0
+    skipped = 0
+    deleted = 0
+    in_flight = set()
+
+    # Fingerprints of documents previously loaded to this collection
+    stored = {}
+    if fingerprints is not None:
+        query = {'collection': collection_name}
+        if ids is not None:
+            query['doc_id'] = {'$in': [ str(_id) for _id in ids ]}
+        for fp in fingerprints.find(query, {'doc_id': 1, 'hash': 1}):
+            stored[fp['doc_id']] = fp['hash']
+
+    def commit(batch, changes):
+        from pymongo import DeleteOne, UpdateOne
+
+        results = batch.commit()
+        if changes:
+            ops = [
+                UpdateOne(
+                    {'_id': f'{collection_name}/{doc_id}'},
+                    {'$set': {'collection': collection_name, 'doc_id': doc_id, 'hash': fp}},
+                    upsert=True
+                )
+                if fp is not None else DeleteOne({'_id': f'{collection_name}/{doc_id}'})
+                for doc_id, fp in changes
+            ]
+            fingerprints.bulk_write(ops, ordered=False)
+        return results
+
+    def collect(futures):
+        loaded = 0
+        for future in futures:
+            results = future.result()
+            print('Documents Loaded:', len(results))
+            loaded += len(results)
+        return loaded
+
+    def writes():
+        # (doc_id, document or None for deletes)
+        seen = set()
+        for doc in docs:
+            doc_id = str(doc['_id'])
+            seen.add(doc_id)
+            yield doc_id, doc
+        if prune:
+            for doc_id in stored.keys() - seen:
+                yield doc_id, None
+        if ids is not None:
+            for doc_id in { str(_id) for _id in ids } - seen:
+                # Without fingerprints the target may still hold the document
+                if fingerprints is None or doc_id in stored:
+                    yield doc_id, None
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        batch = f_db.batch()
+        changes = []
+        size = 0
+        for doc_id, doc in writes():
+            if doc is None:
+                batch.delete(f_coll.document(doc_id))
+                changes.append((doc_id, None))
+                deleted += 1
+            else:
+                fp = document_fingerprint(doc)
+                if fingerprints is not None and stored.get(doc_id) == fp:
+                    skipped += 1
+                    continue
+                batch.set(f_coll.document(doc_id), doc)
+                changes.append((doc_id, fp))
+            size += 1
+            if size == batch_size:
+                in_flight.add(executor.submit(commit, batch, changes if fingerprints is not None else None))
+                batch = f_db.batch()
+                changes = []
+                size = 0
+
+            # Backpressure, wait for a commit before reading further
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                total += collect(done)
+
+        if size:
+            in_flight.add(executor.submit(commit, batch, changes if fingerprints is not None else None))
+        done, _ = wait(in_flight)
+        total += collect(done)
+
+    if fingerprints is not None:
+        print(f'{collection_name}: {skipped} unchanged, {deleted} deleted')
+
+    return total
@@ -0,0 +1,52 @@
+import argparse
+import time
+
+import pandas as pd
+
+from data_acq_functions import Auth
+from district_locator import INDEX_PATH, DistrictLocator, district_reps, join_reps
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the congressional district and rep for coordinates')
+    parser.add_argument('--build', action='store_true', help='(re)build the index from the cd116 shapefile')
+    parser.add_argument('--index', default=INDEX_PATH)
+    parser.add_argument('--point', type=float, nargs=2, metavar=('LON', 'LAT'))
+    parser.add_argument('--csv', help='CSV with coordinate columns, written back with state, district and rep columns')
+    parser.add_argument('--lon-col', default='lon')
+    parser.add_argument('--lat-col', default='lat')
+    parser.add_argument('--out', help='output CSV (default: overwrite --csv)')
+    args = parser.parse_args()
+
+    if args.build:
+        locator = DistrictLocator.from_shapefile()
+        locator.save(args.index)
+        print(f'Indexed {len(locator.geometries)} districts to {args.index}')
+    else:
+        locator = DistrictLocator.load(args.index)
+
+    if args.point is None and args.csv is None:
+        return
+
+    # In-office reps by district, loaded once
+    config = Auth('./auth/config.ini')
+    reps = district_reps(config.config_mongodb()['reps'])
+
+    if args.point is not None:
+        states, districts = locator.locate_many([args.point[0]], [args.point[1]])
+        print(join_reps(states, districts, reps)[0])
+
+    if args.csv is not None:
+        df = pd.read_csv(args.csv)
+        start = time.perf_counter()
+        states, districts = locator.locate_many(df[args.lon_col].values, df[args.lat_col].values)
+        joined = join_reps(states, districts, reps)
+        df['state'] = states
+        df['district'] = districts
+        df['rep_id'] = [ rep.get('rep_id') if rep else None for rep in joined ]
+        df['rep_name'] = [ rep.get('name') if rep else None for rep in joined ]
+        seconds = time.perf_counter() - start
+        df.to_csv(args.out or args.csv, index=False)
+        print(f'Located {df["state"].notna().sum()} of {len(df)} rows in {seconds:.2f}s')
+
+if __name__ == '__main__':
+    main()
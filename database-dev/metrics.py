@@ -0,0 +1,218 @@
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency histogram buckets (seconds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+class Metrics():
+    '''
+    Process-wide counters, latency histograms and per-member spans, written as
+    JSON lines (set_sink) and/or served as Prometheus text (serve)
+    '''
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.sink = None
+
+    @staticmethod
+    def labels_key(labels):
+        return tuple(sorted( (k, str(v)) for k, v in labels.items() ))
+
+    def inc(self, name, value=1, **labels):
+        key = (name, self.labels_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, self.labels_key(labels))
+        with self.lock:
+            hist = self.histograms.setdefault(key, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    hist['buckets'][i] += 1
+                    break
+            hist['sum'] += seconds
+            hist['count'] += 1
+
+    def current_span(self):
+        stack = getattr(self.local, 'spans', None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        '''
+        Context manager timing a unit of work (e.g. one member), collecting errors raised
+        or recorded inside it, written to the sink on exit
+        '''
+
+        span = {'type': 'span', 'name': name, 'attrs': attrs, 'start': time.time(), 'errors': []}
+        if not hasattr(self.local, 'spans'):
+            self.local.spans = []
+        self.local.spans.append(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span['errors'].append({'error': type(e).__name__})
+            raise
+        finally:
+            self.local.spans.pop()
+            span['duration'] = time.perf_counter() - start
+            self.observe('span_seconds', span['duration'], span=name)
+            if span['errors']:
+                self.inc('span_errors_total', span=name)
+            self.write(span)
+
+    def record_error(self, error, **labels):
+        span = self.current_span()
+        if span is not None:
+            span['errors'].append(dict(labels, error=error))
+
+    def set_sink(self, path):
+        self.sink = open(path, 'a')
+
+    def write(self, record):
+        if self.sink is None:
+            return
+        with self.lock:
+            self.sink.write(json.dumps(record, default=str) + '\n')
+            self.sink.flush()
+
+    def snapshot(self):
+        '''
+        Function to write all counters and histograms to the sink as one JSON line
+        '''
+
+        with self.lock:
+            record = {
+                'type': 'snapshot',
+                'time': time.time(),
+                'counters': [ {'name': n, 'labels': dict(l), 'value': v} for (n, l), v in self.counters.items() ],
+                'histograms': [ dict(h, name=n, labels=dict(l)) for (n, l), h in self.histograms.items() ],
+            }
+        self.write(record)
+
+        return record
+
+    def prometheus(self):
+        '''
+        Function to render metrics in Prometheus text exposition format
+        '''
+
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join( f'{k}="{v}"' for k, v in pairs ) + '}'
+
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f'rep_db_{name}{fmt(labels)} {value}')
+            for (name, labels), hist in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, hist['buckets']):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else bound
+                    lines.append(f'rep_db_{name}_bucket{fmt(labels, [("le", le)])} {cumulative}')
+                lines.append(f'rep_db_{name}_sum{fmt(labels)} {hist["sum"]}')
+                lines.append(f'rep_db_{name}_count{fmt(labels)} {hist["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port):
+        '''
+        Function to serve /metrics in Prometheus text format from a background thread
+        '''
+
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        httpd = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+        return httpd
+
+    def percentile(self, hist, q):
+        target = q * hist['count']
+        cumulative = 0
+        for bound, count in zip(BUCKETS, hist['buckets']):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return BUCKETS[-1]
+
+    def summary(self):
+        '''
+        Function to format a run summary: per-function latency and errors, fallbacks, failed spans
+        '''
+
+        lines = [f"{'function':24} {'source':12} {'calls':>6} {'errors':>6} {'mean ms':>9} {'p95 ms':>8}"]
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+        for (name, labels), hist in sorted(histograms.items()):
+            if name != 'function_seconds':
+                continue
+            labels = dict(labels)
+            errors = sum(
+                v for (n, l), v in counters.items()
+                if n == 'function_errors_total' and dict(l)['function'] == labels['function']
+            )
+            mean = hist['sum'] / hist['count'] * 1000 if hist['count'] else 0
+            p95 = self.percentile(hist, 0.95) * 1000
+            lines.append(
+                f"{labels['function']:24} {labels['source']:12} {hist['count']:6d} {errors:6d} {mean:9.1f} {p95:8.0f}"
+            )
+        for (name, labels), value in sorted(counters.items()):
+            if name in ('fallbacks_total', 'function_errors_total', 'span_errors_total', 'http_responses_total'):
+                lines.append(f'{name} {dict(labels)}: {value}')
+
+        return '\n'.join(lines)
+
+
+# Process-wide registry
+METRICS = Metrics()
+
+def instrumented(source):
+    '''
+    Decorator recording latency, calls and errors (by exception type) of a function per source
+    '''
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            labels = {'function': func.__name__, 'source': source}
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                METRICS.inc('function_errors_total', error=type(e).__name__, **labels)
+                METRICS.record_error(type(e).__name__, **labels)
+                raise
+            finally:
+                METRICS.observe('function_seconds', time.perf_counter() - start, **labels)
+                METRICS.inc('function_calls_total', **labels)
+        return wrapper
+    return decorator
@@ -1,50 +1,34 @@
-import pymongo
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import firestore
 from data_acq_functions import Auth
-from etl_functions import clean_edu, et_mongo2firestore
+from etl_functions import clean_edu, stream_mongo2firestore
+from load_functions import load_firestore
 
 # Maximum batch writes for Firestore
 MAX_RESULTS = 500
 
-def main():
-    # Configure databases
-    config = Auth('./auth/config.ini')
-    FIREBASE_CERT = config.get_configs('firebase')[0]
-    cred = credentials.Certificate(FIREBASE_CERT)
-    firebase_admin.initialize_app(cred)
-    f_db = firestore.client() # Firestore database
-    m_db = config.config_mongodb() # MongoDB database
+def load(m_db, f_db):
     m_coll = m_db['reps']
 
     # Clean educational data type in database, preparing for unwinding
     clean_edu(m_coll)
 
-    # Paginated results and batch write
-    total_docs = m_coll.count_documents({})
-    pages = total_docs // MAX_RESULTS
-    page_num = 0
-    total = 0
+    # Single streaming cursor loaded in concurrent batches
+    # (unchanged reps are skipped, reps no longer in office are deleted)
+    reps = stream_mongo2firestore(m_coll, MAX_RESULTS)
+    fingerprints = m_db['firestore_fingerprints']
+    total = load_firestore(f_db, 'reps', reps, MAX_RESULTS, fingerprints=fingerprints, prune=True)
 
-    for i in range(pages + 1):
-        # Extract and transform from MongoDB
-        reps = et_mongo2firestore(m_coll, page_num, MAX_RESULTS)
+    print(f'*** Total Documents Loaded: {total} ***')
 
-        # Load to Firestore
-        batch = f_db.batch()
-        for rep in reps:
-            ref = f_db.collection('reps').document(rep['_id'])
-            batch.set(ref, rep)
-        
-        results = batch.commit()
-        print('Documents Loaded:', len(results))
+    return total
 
-        total += len(results)
-        page_num += 1
+def main():
+    # Configure databases
+    config = Auth('./auth/config.ini')
+    f_db = config.config_firestore() # Firestore database
+    m_db = config.config_mongodb() # MongoDB database
 
-    print(f'*** Total Documents Loaded: {total} ***')
+    load(m_db, f_db)
     
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,38 +1,17 @@
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import firestore
-
 from data_acq_functions import Auth
-from etl_functions import gender_by_state, party_by_state
+import states_to_firestore
+
+def load(m_db, f_db):
+    # Gender and party summaries from the single-pass state summaries
+    return states_to_firestore.load(m_db, f_db, ['gender', 'party'])
 
 def main():
     # Config databases
     config = Auth('./auth/config.ini')
     m_db = config.config_mongodb()
-    m_coll = m_db['reps']
-    FIREBASE_CERT = config.get_configs('firebase')[0]
-    cred = credentials.Certificate(FIREBASE_CERT)
-    firebase_admin.initialize_app(cred)
-    f_db = firestore.client()
-    gen_coll = f_db.collection('state_gender')
-    party_coll = f_db.collection('state_party')
-    batch = f_db.batch()
-
-    # ETL gender by state
-    states = gender_by_state(m_coll)
-    for state in states:
-        ref = gen_coll.document(state['_id'])
-        batch.set(ref, state)
-    results = batch.commit()
-    print('Gender by State Docs Loaded:', len(results))
+    f_db = config.config_firestore()
 
-    # ETL party by state
-    states = party_by_state(m_coll)
-    for state in states:
-        ref = party_coll.document(state['_id'])
-        batch.set(ref, state)
-    results = batch.commit()
-    print('Party by State Docs Loaded:', len(results))
+    load(m_db, f_db)
 
 if __name__ == '__main__':
     main()
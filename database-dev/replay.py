@@ -0,0 +1,173 @@
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+# Query parameters never written to fixture keys
+SECRET_PARAMS = {'apikey', 'key'}
+
+# Response headers kept in fixtures
+KEPT_HEADERS = {'content-type', 'etag', 'last-modified'}
+
+
+class FixtureStore():
+    '''
+    Directory of recorded responses, one gzipped JSON file per request
+    (keyed by host, path and query without secrets)
+    '''
+
+    def __init__(self, fixture_dir):
+        self.fixture_dir = fixture_dir
+        os.makedirs(fixture_dir, exist_ok=True)
+
+    @staticmethod
+    def key(host, path, query):
+        params = sorted( (k, v) for k, v in parse_qsl(query, keep_blank_values=True) if k not in SECRET_PARAMS )
+        raw = f'{host}{path}?{urlencode(params)}'
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.fixture_dir, f'{key}.json.gz')
+
+    def load(self, key):
+        if not os.path.exists(self.path(key)):
+            return None
+        with gzip.open(self.path(key), 'rt') as f:
+            fixture = json.load(f)
+        fixture['body'] = base64.b64decode(fixture['body'])
+
+        return fixture
+
+    def save(self, key, url, status, headers, body):
+        fixture = {
+            'url': url,
+            'status': status,
+            'headers': { k: v for k, v in headers.items() if k.lower() in KEPT_HEADERS },
+            'body': base64.b64encode(body).decode(),
+        }
+        with gzip.open(self.path(key), 'wt') as f:
+            json.dump(fixture, f)
+
+
+class ReplayServer():
+    '''
+    Local stand-in HTTP server for every external source: {server}/host/path?query.
+    mode='record' forwards to https://host/path and saves fixtures, mode='replay' serves
+    fixtures with injected latency (seconds, +/- jitter) and error rate (503s)
+    '''
+
+    def __init__(self, fixture_dir, mode='replay', port=0, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.store = FixtureStore(fixture_dir)
+        self.mode = mode
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stats = {'served': 0, 'recorded': 0, 'missing': 0, 'injected_errors': 0}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self.handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}'
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                host, _, path = parts.path.lstrip('/').partition('/')
+                path = '/' + path
+                key = server.store.key(host, path, parts.query)
+
+                if server.mode == 'record':
+                    url = f'https://{host}{path}' + (f'?{parts.query}' if parts.query else '')
+                    headers = {
+                        k: v for k, v in self.headers.items()
+                        if k.lower() not in ('host', 'accept-encoding', 'connection')
+                    }
+                    r = requests.get(url, headers=headers, timeout=60)
+                    server.store.save(key, url, r.status_code, r.headers, r.content)
+                    server.count('recorded')
+                    return self.reply(r.status_code, r.headers, r.content)
+
+                if server.latency or server.jitter:
+                    time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+                if random.random() < server.error_rate:
+                    server.count('injected_errors')
+                    return self.reply(503, {'Retry-After': '1'}, b'{"error": "injected"}')
+
+                fixture = server.store.load(key)
+                if fixture is None:
+                    server.count('missing')
+                    return self.reply(404, {'Content-Type': 'application/json'}, b'{"error": "no fixture"}')
+                server.count('served')
+                self.reply(fixture['status'], fixture['headers'], fixture['body'])
+
+            def reply(self, status, headers, body):
+                self.send_response(status)
+                for k, v in headers.items():
+                    if k.lower() in KEPT_HEADERS or k.lower() == 'retry-after':
+                        self.send_header(k, v)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record or replay external API responses')
+    parser.add_argument('mode', choices=['record', 'replay'])
+    parser.add_argument('--fixtures', default='./fixtures')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = ReplayServer(args.fixtures, args.mode, args.port, args.latency, args.jitter, args.error_rate)
+    print(f'{args.mode} server at {server.url} (set REP_DB_PROXY={server.url})')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(server.stats)
+
+if __name__ == '__main__':
+    main()
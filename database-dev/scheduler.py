@@ -0,0 +1,301 @@
+import contextlib
+import email.utils
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from metrics import METRICS
+
+# (tokens per second, burst) per upstream host
+DEFAULT_RATES = {
+    'api.propublica.org': (5.0, 10),
+    'kgsearch.googleapis.com': (10.0, 20),
+    'en.wikipedia.org': (10.0, 20),
+    'www.opensecrets.org': (1.0, 2),
+    'votesmart.org': (2.0, 4),
+    'justfacts.votesmart.org': (2.0, 4),
+}
+DEFAULT_RATE = (5.0, 10)
+
+# Priority lanes: quick API calls ('api') and HTML scrapes ('scrape'), with the share of
+# a host's burst the scrape lane leaves to the api lane
+LANES = ('api', 'scrape')
+SCRAPE_RESERVE = 0.25
+
+# Responses that slow a host down and are retried
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# Attempts per request (first try included)
+MAX_ATTEMPTS = 4
+
+# Exponential backoff (seconds): BASE_BACKOFF * 2 ** (failures - 1), capped, with jitter
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+# Rate scale after a throttling response (halved, never below MIN_SCALE) and recovered per success
+MIN_SCALE = 0.1
+RECOVERY = 0.05
+
+# Longest single sleep while waiting for a token (seconds)
+MAX_SLEEP = 5.0
+
+# Per-thread callback run when a token is granted (see on_grant)
+GRANTS = threading.local()
+
+@contextlib.contextmanager
+def on_grant(callback):
+    '''
+    Function to run callback each time the calling thread is granted a token inside the block
+    (e.g. to start a latency budget once throttling waits are over)
+    '''
+
+    previous = getattr(GRANTS, 'callback', None)
+    GRANTS.callback = callback
+    try:
+        yield
+    finally:
+        GRANTS.callback = previous
+
+def retry_after(value):
+    '''
+    Helper function to parse a Retry-After header (seconds or HTTP date) into seconds
+    '''
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateScheduler():
+    '''
+    Token bucket per host shared by every thread and process through a SQLite file,
+    slowed down by 429/5xx responses (Retry-After or jittered exponential backoff,
+    halved rate recovering on success) with priority lanes per request
+    '''
+
+    def __init__(self, path, rates=None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.rates = dict(DEFAULT_RATES, **(rates or {}))
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS buckets (host TEXT PRIMARY KEY, tokens REAL, updated REAL, '
+            'blocked_until REAL, failures INTEGER, scale REAL)'
+        )
+        self.lock = threading.Lock()
+
+    def transaction(self, host, update):
+        '''
+        Function to read-modify-write a host's bucket in one exclusive transaction
+        (update: callable(bucket dict, now) returning its result)
+        '''
+
+        rate, burst = self.rates.get(host, DEFAULT_RATE)
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.conn.execute(
+                    'SELECT tokens, updated, blocked_until, failures, scale FROM buckets WHERE host = ?', (host,)
+                ).fetchone()
+                now = time.time()
+                if row is None:
+                    bucket = {'tokens': float(burst), 'updated': now, 'blocked_until': 0.0, 'failures': 0, 'scale': 1.0}
+                else:
+                    bucket = dict(zip(['tokens', 'updated', 'blocked_until', 'failures', 'scale'], row))
+                # Refill at the (scaled) rate since the last update
+                elapsed = max(0.0, now - bucket['updated'])
+                bucket['tokens'] = min(burst, bucket['tokens'] + elapsed * rate * bucket['scale'])
+                bucket['updated'] = now
+                result = update(bucket, now, rate, burst)
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?, ?)',
+                    (host, bucket['tokens'], bucket['updated'], bucket['blocked_until'], bucket['failures'], bucket['scale'])
+                )
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+        return result
+
+    def acquire(self, host, lane='api'):
+        '''
+        Function to block until a token for host is available, returning the seconds waited
+        '''
+
+        def take(bucket, now, rate, burst):
+            if now < bucket['blocked_until']:
+                return bucket['blocked_until'] - now
+            needed = 1.0 + (burst * SCRAPE_RESERVE if lane == 'scrape' else 0.0)
+            if bucket['tokens'] >= needed:
+                bucket['tokens'] -= 1.0
+                return 0.0
+            return (needed - bucket['tokens']) / (rate * bucket['scale'])
+
+        waited = 0.0
+        while True:
+            wait = self.transaction(host, take)
+            if wait <= 0:
+                break
+            wait = min(wait, MAX_SLEEP)
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            METRICS.observe('scheduler_wait_seconds', waited, host=host, lane=lane)
+        callback = getattr(GRANTS, 'callback', None)
+        if callback is not None:
+            callback()
+
+        return waited
+
+    def backoff(self, host, delay=None):
+        '''
+        Function to block a host after a throttling response: Retry-After delay when given,
+        else jittered exponential backoff; the host's rate is halved
+        '''
+
+        def penalize(bucket, now, rate, burst):
+            bucket['failures'] += 1
+            if delay is not None:
+                pause = delay * random.uniform(1.0, 1.2)
+            else:
+                pause = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (bucket['failures'] - 1)) * random.uniform(0.5, 1.5)
+            bucket['blocked_until'] = max(bucket['blocked_until'], now + pause)
+            bucket['tokens'] = 0.0
+            bucket['scale'] = max(MIN_SCALE, bucket['scale'] / 2)
+            return pause
+
+        pause = self.transaction(host, penalize)
+        METRICS.inc('scheduler_backoffs_total', host=host)
+
+        return pause
+
+    def success(self, host):
+        '''
+        Function to reset failures and recover the rate of a host after a good response
+        '''
+
+        with self.lock:
+            self.conn.execute(
+                'UPDATE buckets SET failures = 0, scale = MIN(1.0, scale + ?) WHERE host = ? AND (failures > 0 OR scale < 1.0)',
+                (RECOVERY, host)
+            )
+
+    def call(self, host, func, lane='api', status=None, delay=None):
+        '''
+        Function to run func (one outbound call) under the scheduler, retrying throttled calls
+        (status/delay: callables extracting the HTTP status and Retry-After seconds from
+        func's result, or from an exception it raised)
+        '''
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            self.acquire(host, lane)
+            try:
+                result = func()
+                error = None
+            except Exception as e:
+                result = None
+                error = e
+            code = status(error if error is not None else result)
+            if code not in RETRY_STATUSES or attempt == MAX_ATTEMPTS:
+                break
+            METRICS.inc('scheduler_retries_total', host=host, status=code)
+            self.backoff(host, delay(error if error is not None else result))
+            if hasattr(result, 'close'): # Release the throttled response's connection
+                result.close()
+
+        if error is not None:
+            raise error
+        if code is not None and code < 400:
+            self.success(host)
+
+        return result
+
+
+class ScheduledRequest():
+    '''
+    googleapiclient HttpRequest whose execute() goes through the scheduler
+    '''
+
+    def __init__(self, request, scheduler, host):
+        self.request = request
+        self.scheduler = scheduler
+        self.host = host
+
+    def execute(self, *args, **kwargs):
+        def status(outcome):
+            resp = getattr(outcome, 'resp', None) # HttpError
+            return 200 if resp is None and not isinstance(outcome, Exception) else getattr(resp, 'status', None)
+
+        def delay(outcome):
+            resp = getattr(outcome, 'resp', None)
+            return retry_after(resp.get('retry-after')) if resp is not None else None
+
+        return self.scheduler.call(self.host, lambda: self.request.execute(*args, **kwargs), 'api', status, delay)
+
+
+class ScheduledEntities():
+    '''
+    Knowledge Graph entities resource whose search requests are scheduled
+    '''
+
+    def __init__(self, entities, scheduler, host='kgsearch.googleapis.com'):
+        self.entities = entities
+        self.scheduler = scheduler
+        self.host = host
+
+    def search(self, **kwargs):
+        return ScheduledRequest(self.entities.search(**kwargs), self.scheduler, self.host)
+
+
+def scheduled_adapter(scheduler, host, lane='api'):
+    '''
+    Function to build a requests HTTPAdapter sending every request through the scheduler
+    (requests imported here, not at startup)
+    '''
+
+    from requests.adapters import HTTPAdapter
+
+    class ScheduledAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            return scheduler.call(
+                host, lambda: super(ScheduledAdapter, self).send(request, **kwargs), lane,
+                status=lambda r: getattr(r, 'status_code', None),
+                delay=lambda r: retry_after(r.headers.get('Retry-After')) if hasattr(r, 'headers') else None
+            )
+
+    return ScheduledAdapter()
+
+
+class ScheduledWiki():
+    '''
+    MediaWiki client whose HTTP requests (several per page lookup) each take a scheduler
+    token, throttled responses retried, through an adapter mounted on its session
+    '''
+
+    def __init__(self, wikipedia, scheduler, host='en.wikipedia.org'):
+        self.wikipedia = wikipedia
+        self.adapter = scheduled_adapter(scheduler, host)
+
+    def mount(self):
+        # pymediawiki replaces its session when its configuration changes
+        session = self.wikipedia._session
+        if session.adapters.get('https://') is not self.adapter:
+            session.mount('https://', self.adapter)
+            session.mount('http://', self.adapter)
+
+        return self.wikipedia
+
+    def page(self, *args, **kwargs):
+        return self.mount().page(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.mount(), name)
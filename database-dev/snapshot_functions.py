@@ -0,0 +1,304 @@
+import itertools
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+from edu_functions import DEFAULT_EDUCATION
+from etl_functions import EDU_SUMMARY_CATEGORIES, STATE_ABBRS
+
+# Docs per record batch while flattening the reps cursor
+BATCH_SIZE = 1000
+
+# Scalar rep fields copied as strings
+REP_FIELDS = [
+    'first_name', 'middle_name', 'last_name', 'dob', 'gender', 'current_party', 'state',
+    'google_id', 'votesmart_id', 'govtrack_id', 'cspan_id', 'crp_id', 'fec_id', 'wiki_url', 'member_hash'
+]
+
+# One table per nested level, joined on member_id
+SCHEMAS = {
+    'reps': pa.schema(
+        [('_id', pa.string())]
+        + [ (field, pa.string()) for field in REP_FIELDS ]
+        + [
+            ('in_office', pa.bool_()),
+            ('chamber', pa.string()),
+            ('district', pa.string()),
+            ('degree_codes', pa.list_(pa.string())),
+            ('degree_categories', pa.list_(pa.string())),
+        ]
+    ),
+    'roles': pa.schema([
+        ('member_id', pa.string()),
+        ('ordinal', pa.int16()),
+        ('congress', pa.int16()),
+        ('chamber', pa.string()),
+        ('state', pa.string()),
+        ('party', pa.string()),
+        ('district', pa.string()),
+    ]),
+    'committees': pa.schema([
+        ('member_id', pa.string()),
+        ('congress', pa.int16()),
+        ('chamber', pa.string()),
+        ('name', pa.string()),
+        ('code', pa.string()),
+        ('parent_code', pa.string()),
+    ]),
+    'education': pa.schema([
+        ('member_id', pa.string()),
+        ('ordinal', pa.int16()),
+        ('degree', pa.string()),
+        ('institution', pa.string()),
+        ('institution_id', pa.string()),
+    ]),
+}
+
+# Hive partition columns per table
+PARTITIONS = {
+    'reps': 'state',
+    'roles': 'congress',
+    'committees': 'congress',
+}
+
+
+#####################
+# Snapshot Exporter #
+#####################
+
+def to_str(value):
+    return None if value is None else str(value)
+
+def flatten_rep(rep):
+    '''
+    Function to flatten one reps document into rows of each snapshot table
+    '''
+
+    roles = rep.get('roles') or []
+    current = roles[0] if roles else {}
+    rows = {
+        'reps': [dict(
+            { field: to_str(rep.get(field)) for field in REP_FIELDS },
+            _id=rep['_id'],
+            in_office=rep.get('in_office'),
+            chamber=current.get('chamber'),
+            district=to_str(current.get('district')),
+            degree_codes=rep.get('degree_codes'),
+            degree_categories=rep.get('degree_categories'),
+        )],
+        'roles': [],
+        'committees': [],
+        'education': [],
+    }
+    for i, role in enumerate(roles):
+        rows['roles'].append({
+            'member_id': rep['_id'],
+            'ordinal': i,
+            'congress': int(role['congress']),
+            'chamber': role.get('chamber'),
+            'state': role.get('state'),
+            'party': role.get('party'),
+            'district': to_str(role.get('district')),
+        })
+        committees = [ dict(comm, parent_code=None) for comm in role.get('committees', []) ]
+        for comm in committees + role.get('subcommittees', []):
+            rows['committees'].append({
+                'member_id': rep['_id'],
+                'congress': int(role['congress']),
+                'chamber': role.get('chamber'),
+                'name': comm['name'],
+                'code': comm['code'],
+                'parent_code': comm['parent_code'],
+            })
+    institution_ids = rep.get('institution_ids') or []
+    for i, edu in enumerate(rep.get('education') or []):
+        rows['education'].append({
+            'member_id': rep['_id'],
+            'ordinal': i,
+            'degree': edu[0],
+            'institution': edu[1] if len(edu) > 1 else None,
+            'institution_id': institution_ids[i] if i < len(institution_ids) else None,
+        })
+
+    return rows
+
+def export_snapshot(collection, path, fmt='parquet'):
+    '''
+    Function to flatten the reps collection into partitioned Parquet (or Arrow IPC, fmt='ipc')
+    datasets under path/{reps,roles,committees,education}, returning row counts per table
+    '''
+
+    # Flattened rows are buffered as Arrow record batches (columnar, not dicts)
+    batches = { table: [] for table in SCHEMAS }
+    rows = { table: [] for table in SCHEMAS }
+
+    def flush():
+        for table, schema in SCHEMAS.items():
+            if rows[table]:
+                batches[table].append(pa.RecordBatch.from_pylist(rows[table], schema=schema))
+                rows[table] = []
+
+    for i, rep in enumerate(collection.find({}, batch_size=BATCH_SIZE), 1):
+        for table, table_rows in flatten_rep(rep).items():
+            rows[table].extend(table_rows)
+        if i % BATCH_SIZE == 0:
+            flush()
+    flush()
+
+    counts = {}
+    for table, schema in SCHEMAS.items():
+        partitioning = None
+        if table in PARTITIONS:
+            partitioning = ds.partitioning(pa.schema([schema.field(PARTITIONS[table])]), flavor='hive')
+        ds.write_dataset(
+            pa.Table.from_batches(batches[table], schema=schema),
+            os.path.join(path, table),
+            format=fmt,
+            partitioning=partitioning,
+            existing_data_behavior='delete_matching'
+        )
+        counts[table] = sum( batch.num_rows for batch in batches[table] )
+
+    return counts
+
+
+##############
+# Query Path #
+##############
+
+def load_snapshot(path, fmt='parquet'):
+    '''
+    Function to open every snapshot table from memory-mapped files
+    (uncompressed Arrow IPC columns are used in place, zero-copy)
+    '''
+
+    filesystem = pafs.LocalFileSystem(use_mmap=True)
+    tables = {}
+    for table, schema in SCHEMAS.items():
+        partitioning = None
+        if table in PARTITIONS:
+            partitioning = ds.partitioning(pa.schema([schema.field(PARTITIONS[table])]), flavor='hive')
+        dataset = ds.dataset(
+            os.path.join(path, table), schema=schema, format=fmt, partitioning=partitioning,
+            filesystem=filesystem
+        )
+        tables[table] = dataset.to_table()
+
+    return tables
+
+def house_reps(reps, states_only=False):
+    '''
+    Function to filter in-office House reps (same match as etl_functions.HOUSE_MATCH/STATE_MATCH)
+    '''
+
+    mask = pc.and_(
+        pc.fill_null(reps['in_office'], False),
+        pc.fill_null(pc.not_equal(reps['chamber'], 'Senate'), True)
+    )
+    if states_only:
+        mask = pc.and_(mask, pc.is_in(reps['state'], value_set=pa.array(STATE_ABBRS)))
+
+    return reps.filter(mask)
+
+def counts_by_state(reps, column, values):
+    '''
+    Helper function to count reps per state for each value of a column
+    '''
+
+    flags = reps.select(['state'])
+    for value in values:
+        flags = flags.append_column(value, pc.cast(pc.equal(reps[column], value), pa.int64()))
+    grouped = flags.group_by('state').aggregate([ (value, 'sum') for value in values ])
+
+    return [
+        dict({ value: row[f'{value}_sum'] or 0 for value in values }, _id=row['state'])
+        for row in grouped.to_pylist()
+    ]
+
+def party_by_state(snapshot):
+    return counts_by_state(house_reps(snapshot['reps'], True), 'current_party', ['R', 'D', 'I'])
+
+def gender_by_state(snapshot):
+    return counts_by_state(house_reps(snapshot['reps'], True), 'gender', ['M', 'F'])
+
+def edu_by_state(snapshot):
+    '''
+    Function to count reps with each summarized degree category by state (as
+    etl_functions.edu_stages, same keys)
+    '''
+
+    reps = house_reps(snapshot['reps'], True)
+    totals = reps.group_by('state').aggregate([('_id', 'count')])
+
+    # One row per (rep, category), each rep counted once per category (null lists add no rows)
+    categories = reps['degree_categories']
+    exploded = pa.table({
+        'rep': pc.list_parent_indices(categories),
+        'category': pc.list_flatten(categories),
+    })
+    exploded = exploded.group_by(['rep', 'category']).aggregate([])
+    exploded = exploded.append_column('state', pc.take(reps['state'], exploded['rep']))
+    counts = exploded.group_by(['state', 'category']).aggregate([('rep', 'count')])
+
+    states = {
+        row['state']: dict({ k: 0 for k in EDU_SUMMARY_CATEGORIES }, _id=row['state'], count=row['_id_count'])
+        for row in totals.to_pylist()
+    }
+    for row in counts.to_pylist():
+        if row['category'] in EDU_SUMMARY_CATEGORIES:
+            states[row['state']][row['category']] = row['rep_count']
+
+    return sorted(states.values(), key=lambda state: state['count'], reverse=True)
+
+def state_summaries(snapshot):
+    return {
+        'edu': edu_by_state(snapshot),
+        'party': party_by_state(snapshot),
+        'gender': gender_by_state(snapshot),
+    }
+
+def firestore_reps(snapshot, page_num=None, max_results=None):
+    '''
+    Function to reshape in-office reps for Firestore (as etl_functions.et_mongo2firestore,
+    all reps when page_num is None)
+    '''
+
+    reps = house_reps(snapshot['reps']).sort_by('_id')
+
+    # Education of the selected reps, in stored order
+    education = snapshot['education']
+    education = education.filter(pc.is_in(education['member_id'], value_set=reps['_id']))
+    education = education.sort_by([('member_id', 'ascending'), ('ordinal', 'ascending')])
+    edus = {
+        member_id: list(rows)
+        for member_id, rows in itertools.groupby(education.to_pylist(), key=lambda row: row['member_id'])
+    }
+
+    columns = ['_id', 'first_name', 'last_name', 'dob', 'gender', 'current_party', 'state', 'district', 'wiki_url']
+    docs = []
+    # Reps without education get the default, as in the pipeline
+    default = [ {'degree': degree, 'institution': institution} for degree, institution in DEFAULT_EDUCATION ]
+    for rep in reps.select(columns).to_pylist():
+        rows = edus.get(rep['_id'], default)
+        district = rep['district']
+        docs.append({
+            '_id': rep['_id'],
+            'name': f"{rep['first_name']} {rep['last_name']}",
+            'dob': rep['dob'],
+            'gender': rep['gender'],
+            'party': rep['current_party'],
+            'state': rep['state'],
+            'district': int(district) if district is not None and district.isdigit() else district,
+            'wikipedia': rep['wiki_url'],
+            'degrees': [ row['degree'] for row in rows ],
+            'education': [ row['institution'] for row in rows ],
+        })
+
+    # Pages as $skip/$limit after $group
+    if page_num is not None:
+        docs = docs[page_num * max_results:(page_num + 1) * max_results]
+
+    return docs
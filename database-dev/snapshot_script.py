@@ -0,0 +1,48 @@
+import argparse
+import time
+
+from data_acq_functions import Auth
+from etl_functions import clean_edu
+from load_functions import load_firestore
+from snapshot_functions import export_snapshot, firestore_reps, load_snapshot, state_summaries
+from states_to_firestore import COLLECTIONS
+
+# Snapshot directory (one subdirectory per table)
+SNAPSHOT_DIR = './snapshots/latest'
+
+def main():
+    parser = argparse.ArgumentParser(description='Export reps to a columnar snapshot or query one')
+    parser.add_argument('command', choices=['export', 'summaries', 'firestore'])
+    parser.add_argument('--path', default=SNAPSHOT_DIR)
+    parser.add_argument('--format', choices=['parquet', 'ipc'], default='parquet')
+    args = parser.parse_args()
+
+    config = Auth('./auth/config.ini')
+
+    if args.command == 'export':
+        m_coll = config.config_mongodb()['reps']
+        clean_edu(m_coll)
+        start = time.perf_counter()
+        counts = export_snapshot(m_coll, args.path, args.format)
+        print(f'Snapshot rows: {counts} ({time.perf_counter() - start:.2f}s)')
+        return
+
+    snapshot = load_snapshot(args.path, args.format)
+    summaries = state_summaries(snapshot)
+
+    if args.command == 'summaries':
+        for key, states in summaries.items():
+            print(key, states)
+        return
+
+    # Firestore loads from the snapshot (MongoDB only holds fingerprints)
+    f_db = config.config_firestore()
+    fingerprints = config.config_mongodb()['firestore_fingerprints']
+    total = load_firestore(f_db, 'reps', firestore_reps(snapshot), fingerprints=fingerprints, prune=True)
+    print(f'*** Total Documents Loaded: {total} ***')
+    for key, collection_name in COLLECTIONS.items():
+        total = load_firestore(f_db, collection_name, summaries[key], fingerprints=fingerprints)
+        print(f'{collection_name} Docs Loaded:', total)
+
+if __name__ == '__main__':
+    main()
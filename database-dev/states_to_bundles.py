@@ -0,0 +1,126 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+
+from data_acq_functions import Auth
+from etl_functions import STATE_ABBRS, clean_edu, ensure_indexes, state_summaries, stream_mongo2firestore
+
+# Optional brotli variants (gzip only otherwise)
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Dashboard static data (topologies in, bundles out)
+DATA_DIR = '../app-dev/public/data'
+
+# Characters of the content hash in bundle filenames
+HASH_LENGTH = 12
+
+def district_key(district):
+    # Same keys as the dashboard's district paths (cd00 for at-large)
+    if district == 'At-Large':
+        return 'cd00'
+    return f'cd{int(district):02d}'
+
+def state_bundles(collection, data_dir=DATA_DIR):
+    '''
+    Function to join reps, education/party/gender summaries and topology into one bundle per state
+    (summaries go to the manifest, the national map needs every state's on load)
+    '''
+
+    bundles = {
+        state: {
+            'state': state, 'reps': {}, 'topology': None,
+            'summary': {'edu': None, 'party': None, 'gender': None}
+        }
+        for state in STATE_ABBRS
+    }
+
+    # Reps in their Firestore shape, keyed by district
+    for rep in stream_mongo2firestore(collection):
+        if rep['state'] in bundles:
+            bundles[rep['state']]['reps'][district_key(rep['district'])] = rep
+
+    # State summaries in one pass
+    summaries = state_summaries(collection)
+    for key, states in summaries.items():
+        for summary in states:
+            if summary['_id'] in bundles:
+                bundles[summary['_id']]['summary'][key] = { k: v for k, v in summary.items() if k != '_id' }
+
+    # District topology written by the TopoJSON pipeline
+    for state, bundle in bundles.items():
+        path = os.path.join(data_dir, f'{state}.topo.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                bundle['topology'] = json.load(f)
+
+    return bundles
+
+def write_bundles(bundles, out_dir):
+    '''
+    Function to write content-hashed JSON, gzip and brotli files (reps and topology) per state
+    plus manifest.json with their names and each state's summaries, removing bundles no longer referenced
+    '''
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    for state, bundle in bundles.items():
+        content = { k: v for k, v in bundle.items() if k != 'summary' }
+        raw = json.dumps(content, sort_keys=True, separators=(',', ':'), default=str).encode()
+        digest = hashlib.sha256(raw).hexdigest()[:HASH_LENGTH]
+        name = f'{state}.{digest}.json'
+        files = {
+            'json': (name, raw),
+            'gzip': (f'{name}.gz', gzip.compress(raw, compresslevel=9, mtime=0)),
+        }
+        if brotli is not None:
+            files['br'] = (f'{name}.br', brotli.compress(raw, quality=11))
+
+        manifest[state] = {}
+        for encoding, (filename, body) in files.items():
+            path = os.path.join(out_dir, filename)
+            if not os.path.exists(path): # Same name, same content
+                with open(path, 'wb') as f:
+                    f.write(body)
+            manifest[state][encoding] = filename
+        manifest[state]['bytes'] = { encoding: len(body) for encoding, (_, body) in files.items() }
+        manifest[state]['summary'] = bundle['summary']
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, sort_keys=True, indent=1)
+
+    # Previous content hashes
+    current = { files[encoding] for files in manifest.values() for encoding in ('json', 'gzip', 'br') if encoding in files }
+    for filename in os.listdir(out_dir):
+        if filename != 'manifest.json' and filename not in current:
+            os.remove(os.path.join(out_dir, filename))
+
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description='Write precomputed per-state dashboard bundles')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    args = parser.parse_args()
+
+    # Config database
+    config = Auth('./auth/config.ini')
+    m_coll = config.config_mongodb()['reps']
+
+    # Clean educational data type in database, preparing for unwinding
+    clean_edu(m_coll)
+    ensure_indexes(m_coll)
+
+    bundles = state_bundles(m_coll, args.data_dir)
+    manifest = write_bundles(bundles, os.path.join(args.data_dir, 'bundles'))
+
+    sizes = [ files['bytes'] for files in manifest.values() ]
+    print(f'Bundles written: {len(manifest)}')
+    for encoding in sizes[0] if sizes else []:
+        print(f'  {encoding}: {sum( size[encoding] for size in sizes ) / 1024:.1f} KiB')
+
+if __name__ == '__main__':
+    main()
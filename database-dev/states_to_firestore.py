@@ -0,0 +1,44 @@
+from data_acq_functions import Auth
+from etl_functions import ensure_indexes, state_summaries
+from load_functions import load_firestore
+
+# Firestore collection for each state summary
+COLLECTIONS = {
+    'edu': 'state_edu',
+    'party': 'state_party',
+    'gender': 'state_gender',
+}
+
+def load(m_db, f_db, keys=None):
+    '''
+    Function to load state summaries (all, or the given COLLECTIONS keys) to Firestore
+    '''
+
+    m_coll = m_db['reps']
+    fingerprints = m_db['firestore_fingerprints']
+
+    # Extract all state summaries from MongoDB in one pass
+    ensure_indexes(m_coll)
+    summaries = state_summaries(m_coll)
+
+    # Load each summary to its Firestore collection
+    total = 0
+    for key, collection_name in COLLECTIONS.items():
+        if keys is not None and key not in keys:
+            continue
+        loaded = load_firestore(f_db, collection_name, summaries[key], fingerprints=fingerprints)
+        print(f'{collection_name} Docs Loaded:', loaded)
+        total += loaded
+
+    return total
+
+def main():
+    # Config databases
+    config = Auth('./auth/config.ini')
+    m_db = config.config_mongodb()
+    f_db = config.config_firestore()
+
+    load(m_db, f_db)
+
+if __name__ == '__main__':
+    main()
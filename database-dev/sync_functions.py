@@ -0,0 +1,208 @@
+import threading
+import time
+
+from etl_functions import clean_edu, state_summaries, stream_mongo2firestore
+from load_functions import FIRESTORE_BATCH_SIZE, load_firestore
+from metrics import METRICS
+from states_to_firestore import COLLECTIONS as SUMMARY_COLLECTIONS
+
+# Seconds without new changes before pending changes are flushed
+DEBOUNCE = 1.0
+
+# Longest a change waits for a quiet period before it is flushed anyway (seconds)
+MAX_DELAY = 5.0
+
+# Milliseconds each change stream poll waits on the server
+POLL_MS = 250
+
+# Seconds before reopening the stream after a MongoDB or Firestore error
+RETRY_DELAY = 5.0
+
+# Seconds between full state summary refreshes (flushes only refresh the changed reps' states;
+# the full pass catches reps that moved state or were deleted from MongoDB)
+SUMMARY_INTERVAL = 300.0
+
+# Change stream errors after which the stored resume token is unusable
+# (history lost from the oplog, fatal/invalidated stream): full resync
+RESYNC_CODES = {260, 280, 286}
+
+# Operations that change a rep (documentKey is all that is read)
+OPERATIONS = ['insert', 'update', 'replace', 'delete']
+
+
+class ChangeStreamSync():
+    '''
+    Long-running MongoDB to Firestore sync: changed reps from the collection's change
+    stream are debounced, coalesced into batches of at most batch_size IDs, reshaped with
+    etl_functions.mongo2firestore_pipeline and written to Firestore, then the resume token
+    is stored in MongoDB (sync_state) so a restart replays anything not yet written
+    '''
+
+    def __init__(self, m_db, f_db, collection='reps', target='reps', summaries=True, debounce=DEBOUNCE,
+                 max_delay=MAX_DELAY, batch_size=FIRESTORE_BATCH_SIZE, summary_interval=SUMMARY_INTERVAL):
+        self.collection = m_db[collection]
+        self.f_db = f_db
+        self.target = target
+        self.summaries = summaries
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self.summary_interval = summary_interval
+        self.summarized = time.monotonic()
+        self.state = m_db['sync_state']
+        self.fingerprints = m_db['firestore_fingerprints']
+        self.key = f'{collection}->{target}'
+        self.totals = {'changes': 0, 'flushes': 0, 'written': 0, 'resyncs': 0}
+
+    def load_token(self):
+        doc = self.state.find_one({'_id': self.key})
+
+        return doc['resume_token'] if doc else None
+
+    def save_token(self, token):
+        self.state.update_one(
+            {'_id': self.key}, {'$set': {'resume_token': token, 'updated': time.time()}}, upsert=True
+        )
+
+    def reset(self):
+        self.state.delete_one({'_id': self.key})
+
+    def open(self, token=None):
+        pipeline = [
+            {'$match': {'operationType': {'$in': OPERATIONS}}},
+            {'$project': {'documentKey': 1, 'clusterTime': 1}},
+        ]
+
+        return self.collection.watch(
+            pipeline, resume_after=token, max_await_time_ms=POLL_MS, batch_size=self.batch_size
+        )
+
+    def load_summaries(self, states=None):
+        '''
+        Function to load state summaries (all states, or only those given) to Firestore
+        '''
+
+        if states is None or time.monotonic() - self.summarized >= self.summary_interval:
+            states = None
+            self.summarized = time.monotonic()
+        elif not states:
+            return 0
+        summaries = state_summaries(self.collection, states)
+        total = 0
+        for key, collection_name in SUMMARY_COLLECTIONS.items():
+            total += load_firestore(self.f_db, collection_name, summaries[key], fingerprints=self.fingerprints)
+
+        return total
+
+    def resync(self):
+        '''
+        Function to load every rep (unchanged ones skipped by fingerprint, stale ones pruned),
+        used on first start and when the resume token can no longer be used
+        '''
+
+        clean_edu(self.collection)
+        reps = stream_mongo2firestore(self.collection, self.batch_size)
+        total = load_firestore(
+            self.f_db, self.target, reps, self.batch_size, fingerprints=self.fingerprints, prune=True
+        )
+        if self.summaries:
+            total += self.load_summaries()
+        self.totals['resyncs'] += 1
+        self.totals['written'] += total
+
+        return total
+
+    def flush(self, pending, token):
+        '''
+        Function to write the current state of changed reps (pending: {_id: clusterTime}),
+        deleting reps that left office or were removed, then store the resume token
+        '''
+
+        ids = list(pending)
+        match = {'_id': {'$in': ids}}
+        docs = stream_mongo2firestore(self.collection, self.batch_size, match=match)
+        total = load_firestore(self.f_db, self.target, docs, self.batch_size, fingerprints=self.fingerprints, ids=ids)
+        if self.summaries:
+            found = list(self.collection.find(match, {'state': 1}))
+            # Reps deleted from MongoDB leave no state behind, refresh every state
+            states = { rep.get('state') for rep in found } if len(found) == len(ids) else None
+            total += self.load_summaries(states)
+        self.save_token(token)
+
+        # Seconds from the oldest change in the batch to its write
+        times = [ ts.time for ts in pending.values() if ts is not None ]
+        if times:
+            METRICS.observe('sync_lag_seconds', time.time() - min(times), target=self.target)
+        METRICS.inc('sync_flushes_total', target=self.target)
+        self.totals['flushes'] += 1
+        self.totals['written'] += total
+
+        return total
+
+    def follow(self, token, stop):
+        '''
+        Function to consume the change stream until stop is set, returning False when the
+        stream was invalidated (e.g. the collection was dropped)
+        '''
+
+        with self.open(token) as stream:
+            if token is None:
+                # Stream opened before the full load, changes made during it are replayed
+                self.resync()
+                self.save_token(stream.resume_token)
+
+            pending = {}
+            first = last = None
+            while stream.alive and not stop.is_set():
+                change = stream.try_next()
+                now = time.monotonic()
+                if change is not None:
+                    pending[change['documentKey']['_id']] = change.get('clusterTime')
+                    METRICS.inc('sync_changes_total', target=self.target)
+                    self.totals['changes'] += 1
+                    first = first or now
+                    last = now
+                if pending and (
+                    len(pending) >= self.batch_size
+                    or now - last >= self.debounce
+                    or now - first >= self.max_delay
+                ):
+                    self.flush(pending, stream.resume_token)
+                    pending = {}
+                    first = last = None
+
+            if pending:
+                self.flush(pending, stream.resume_token)
+
+            return stream.alive or stop.is_set()
+
+    def run(self, stop=None):
+        '''
+        Function to sync until stop (threading.Event) is set, reopening the stream from the
+        stored resume token after errors
+        '''
+
+        from google.api_core.exceptions import GoogleAPIError
+        from pymongo.errors import OperationFailure, PyMongoError
+
+        stop = stop or threading.Event()
+        token = self.load_token()
+        while not stop.is_set():
+            try:
+                if self.follow(token, stop):
+                    break
+                print('Change stream invalidated, resyncing')
+                token = None
+            except OperationFailure as e:
+                if e.code not in RESYNC_CODES:
+                    raise
+                print(f'Resume token unusable ({e.code}), resyncing')
+                token = None
+            except (PyMongoError, GoogleAPIError, OSError) as e:
+                # Unsaved changes are replayed from the last stored token
+                print(f'Sync error {e!r}, reopening in {RETRY_DELAY}s')
+                METRICS.inc('sync_errors_total', target=self.target, error=type(e).__name__)
+                stop.wait(RETRY_DELAY)
+                token = self.load_token()
+
+        return self.totals
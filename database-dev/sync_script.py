@@ -0,0 +1,50 @@
+'''
+Real-time MongoDB to Firestore sync from the reps change stream
+
+Change streams need a replica set; locally a single node is enough:
+    mongod --replSet rs0 --dbpath ./rs0 --port 27017 &
+    mongosh --eval 'rs.initiate()'
+    firebase emulators:start --only firestore &
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python sync_script.py
+'''
+
+import argparse
+import signal
+import threading
+
+from data_acq_functions import Auth
+from metrics import METRICS
+from sync_functions import DEBOUNCE, MAX_DELAY, ChangeStreamSync
+
+def main():
+    parser = argparse.ArgumentParser(description='Propagate reps changes to Firestore as they happen')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE, help='seconds without changes before a flush')
+    parser.add_argument('--max-delay', type=float, default=MAX_DELAY, help='longest seconds a change waits')
+    parser.add_argument('--no-summaries', action='store_true', help='skip state summary collections')
+    parser.add_argument('--resync', action='store_true', help='drop the stored resume token and reload everything')
+    parser.add_argument('--metrics-port', type=int, help='serve Prometheus metrics on this port')
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        METRICS.serve(args.metrics_port)
+
+    # Config databases
+    config = Auth('./auth/config.ini')
+    m_db = config.config_mongodb()
+    f_db = config.config_firestore()
+
+    sync = ChangeStreamSync(
+        m_db, f_db, summaries=not args.no_summaries, debounce=args.debounce, max_delay=args.max_delay
+    )
+    if args.resync:
+        sync.reset()
+
+    # Pending changes are flushed before exiting on Ctrl-C or SIGTERM
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    print(sync.run(stop))
+
+if __name__ == '__main__':
+    main()
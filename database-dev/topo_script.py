@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from geo_functions import CD_SHAPEFILE, STATE_SHAPEFILE, build_topology, load_districts, load_national, source_hash
+
+# Dashboard static data
+DATA_DIR = '../app-dev/public/data'
+
+# Source hash and size of every topology written (skips unchanged states)
+MANIFEST = 'topo_manifest.json'
+
+def write_topology(gdf, path, quantization, simplify):
+    '''
+    Function to build and write one topology in a worker process, returning its size in bytes
+    (nothing is written when the build fails)
+    '''
+
+    topo = build_topology(gdf, quantization, simplify)
+    tmp = f'{path}.tmp'
+    topo.to_json(tmp)
+    os.replace(tmp, path)
+
+    return os.path.getsize(path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build per-state and national TopoJSON for the dashboard')
+    parser.add_argument('--cd-shapefile', default=CD_SHAPEFILE)
+    parser.add_argument('--state-shapefile', default=STATE_SHAPEFILE)
+    parser.add_argument('--usa-source', help='raw composite Albers states map (us-atlas), national map skipped if unset')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--quantization', type=float, default=1e5, help='quantization grid size, 0 to disable')
+    parser.add_argument('--simplify', type=float, default=0.001, help='simplification tolerance in source units, 0 to disable')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--force', action='store_true', help='rebuild states whose source is unchanged')
+    args = parser.parse_args()
+
+    # The national output is already simplified, rebuilding from it would simplify it again
+    usa_path = os.path.join(args.data_dir, 'usa.topo.json')
+    if args.usa_source and os.path.realpath(args.usa_source) == os.path.realpath(usa_path):
+        parser.error(f'--usa-source must be the raw us-atlas file, not the output {usa_path}')
+
+    params = {'quantization': args.quantization, 'simplify': args.simplify}
+    manifest_path = os.path.join(args.data_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    # Sources per output file
+    df = load_districts(args.cd_shapefile, args.state_shapefile)
+    sources = { state: df.loc[df['state_abbr'] == state] for state in sorted(df['state_abbr'].unique()) }
+    if args.usa_source:
+        sources['usa'] = load_national(args.usa_source)
+
+    jobs = {}
+    for name, gdf in sources.items():
+        path = os.path.join(args.data_dir, f'{name}.topo.json')
+        digest = source_hash(gdf, params)
+        if not args.force and manifest.get(name, {}).get('hash') == digest and os.path.exists(path):
+            continue
+        jobs[name] = (gdf, path, digest)
+    print(f'Topologies: {len(sources)}, unchanged: {len(sources) - len(jobs)}, building: {len(jobs)}')
+
+    errors = {}
+    os.makedirs(args.data_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        futures = {
+            executor.submit(write_topology, gdf, path, args.quantization, args.simplify): name
+            for name, (gdf, path, _) in jobs.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                size = future.result()
+            except Exception as e:
+                errors[name] = e
+                print(f'Error building {name}: {e!r}')
+                continue
+            previous = manifest.get(name, {}).get('bytes')
+            manifest[name] = {'hash': jobs[name][2], 'bytes': size}
+            change = f' (was {previous / 1024:.1f})' if previous else ''
+            print(f'{name:4} {size / 1024:9.1f} KiB{change}')
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, sort_keys=True, indent=1)
+
+    total = sum( entry['bytes'] for entry in manifest.values() )
+    print(f'Total: {total / 1024:.1f} KiB, errors: {len(errors)}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import functools
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+from http_cache import CachedResponse
+from metrics import METRICS
+from scheduler import MAX_ATTEMPTS, RETRY_STATUSES, retry_after
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 30)
+
+# Chunk size for streamed HTML bodies
+CHUNK_SIZE = 64 * 1024
+
+# Concurrent requests per priority lane, so slow scrapes cannot take every connection
+LANE_LIMITS = {'api': 16, 'scrape': 4}
+
+
+class BudgetExhausted(Exception):
+    '''
+    Raised instead of a request once a host's daily call budget is spent
+    '''
+
+
+class DailyBudget():
+    '''
+    Per-host daily call limit shared by every process through a SQLite file
+    (only network requests are counted, cached responses are free)
+    '''
+
+    def __init__(self, path, limit):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.limit = limit
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS calls (host TEXT, day TEXT, calls INTEGER, PRIMARY KEY (host, day))')
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def today():
+        # OpenSecrets limits reset at midnight UTC
+        return time.strftime('%Y-%m-%d', time.gmtime())
+
+    def acquire(self, host):
+        with self.lock:
+            cursor = self.conn.execute(
+                'INSERT INTO calls VALUES (?, ?, 1) ON CONFLICT (host, day) DO UPDATE SET calls = calls + 1 '
+                'WHERE calls < ?',
+                (host, self.today(), self.limit)
+            )
+            self.conn.commit()
+        if cursor.rowcount == 0:
+            raise BudgetExhausted(f'{host}: daily limit of {self.limit} calls reached')
+
+    def remaining(self, host):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT calls FROM calls WHERE host = ? AND day = ?', (host, self.today())
+            ).fetchone()
+
+        return self.limit - (row[0] if row else 0)
+
+
+class Transport():
+    '''
+    Shared HTTP transport for every external source: one pooled keep-alive
+    session per host, gzip negotiation, timeouts, streaming, optional caching,
+    optional daily call budgets (budgets: {host: DailyBudget}) and an optional
+    per-host rate scheduler (scheduler.RateScheduler) retrying throttled calls
+    '''
+
+    def __init__(self, propublica=None, opensecrets=None, cache=None, timeout=DEFAULT_TIMEOUT, pool_size=16, proxy=None,
+                 budgets=None, scheduler=None, lane_limits=LANE_LIMITS):
+        self.api_root, self.header = propublica or (None, {})
+        self.opensecrets_key, self.opensecrets_root = opensecrets or (None, None)
+        self.cache = cache
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.proxy = proxy
+        self.budgets = budgets or {}
+        self.scheduler = scheduler
+        self.lanes = { lane: threading.BoundedSemaphore(limit) for lane, limit in lane_limits.items() }
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def session(self, url):
+        '''
+        Function to return (creating once) the pooled session for a URL's host
+        '''
+
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.sessions:
+                # requests is imported with the first session, not at startup
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.pool_size,
+                    max_retries=Retry(connect=2, read=0, status=0, backoff_factor=0.5, respect_retry_after_header=False)
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+                self.sessions[host] = session
+
+        return self.sessions[host]
+
+    def route(self, url):
+        '''
+        Function to rewrite https://host/path as {proxy}/host/path when a replay proxy is set
+        '''
+
+        if self.proxy is None:
+            return url
+        parts = urlsplit(url)
+        routed = f'{self.proxy}/{parts.netloc}{parts.path}'
+        if parts.query:
+            routed += '?' + parts.query
+
+        return routed
+
+    def fetch(self, url, params=None, headers=None, stream=False, lane='api'):
+        '''
+        Function to GET a URL over the network in a priority lane ('api' or 'scrape'),
+        retrying 429/5xx responses after the scheduler's backoff
+        '''
+
+        host = urlsplit(url).netloc
+        routed = self.route(url)
+        with self.lanes[lane]:
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                if host in self.budgets:
+                    self.budgets[host].acquire(host)
+                if self.scheduler is not None:
+                    self.scheduler.acquire(host, lane)
+                start = time.perf_counter()
+                r = self.session(routed).get(routed, params=params, headers=headers, timeout=self.timeout, stream=stream)
+                METRICS.observe('http_seconds', time.perf_counter() - start, host=host)
+                METRICS.inc('http_responses_total', host=host, status=r.status_code)
+                if self.scheduler is None or r.status_code not in RETRY_STATUSES or attempt == MAX_ATTEMPTS:
+                    break
+                METRICS.inc('scheduler_retries_total', host=host, status=r.status_code)
+                self.scheduler.backoff(host, retry_after(r.headers.get('Retry-After')))
+                r.close()
+
+        if self.scheduler is not None and r.status_code < 400:
+            self.scheduler.success(host)
+
+        return r
+
+    def get(self, url, params=None, headers=None, lane='api'):
+        '''
+        Function to GET a URL through the host pool, served from the cache when set
+        '''
+
+        fetch = functools.partial(self.fetch, lane=lane)
+        if self.cache is None:
+            return fetch(url, params=params, headers=headers)
+
+        return self.cache.get(url, params=params, headers=headers, fetch=fetch)
+
+    def get_html(self, url, stop=None):
+        '''
+        Function to stream an HTML body in chunks, stopping once the stop marker
+        has been read (the rest of the page is never downloaded)
+        '''
+
+        def fetch_prefix(url, params=None, headers=None):
+            with self.fetch(url, params=params, headers=headers, stream=True, lane='scrape') as r:
+                chunks = []
+                tail = b''
+                marker = stop.encode() if stop else None
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    chunks.append(chunk)
+                    if marker and marker in tail + chunk:
+                        break
+                    tail = chunk[-len(marker):] if marker else b''
+                return CachedResponse(r.url, r.status_code, r.headers, b''.join(chunks), from_cache=False)
+
+        if self.cache is None:
+            return fetch_prefix(url)
+
+        return self.cache.get(url, fetch=fetch_prefix, variant=stop)
+
+    def remaining(self, url):
+        '''
+        Function to return calls left today for a URL's host (None when unbudgeted)
+        '''
+
+        host = urlsplit(url).netloc
+        if host not in self.budgets:
+            return None
+
+        return self.budgets[host].remaining(host)
+
+    def propublica(self, path):
+        return self.get(self.api_root + path, headers=self.header)
+
+    def opensecrets(self, params):
+        return self.get(self.opensecrets_root, params=dict(params, apikey=self.opensecrets_key))
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}